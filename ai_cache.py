@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_prompt(text):
+    """Fold case, whitespace and trailing punctuation so near-identical questions match."""
+    text = re.sub(r'\s+', ' ', (text or '').strip().lower())
+    return text.rstrip(' ?!.')
+
+def _size(text):
+    return len(text.encode('utf-8'))
+
+class ResponseCache:
+    """Two-tier cache for AI Tutor replies.
+
+    The key is a hash of the last context_turns entries of the Gemini
+    `contents` payload, each normalized, so the same question asked in the
+    same context maps to one entry. The in-memory tier is an LRU bounded by
+    entry count and total bytes; the optional SQLite tier (db_path) survives
+    restarts and is shared by every worker on the host. Both honour ttl.
+
+    Because earlier turns are part of the key, a repeated question mostly
+    hits when it opens a conversation (or follows the same exchange); later
+    in a conversation the same words usually mean something different, so
+    they are answered fresh. Every report_every lookups the hit rate and
+    sizes from metrics() are printed, to check the cache is earning its keep.
+    """
+
+    def __init__(self, ttl=24 * 3600, max_entries=1000, max_bytes=8 * 1024 * 1024,
+                 context_turns=4, db_path=None, report_every=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.context_turns = context_turns
+        self.db_path = db_path
+        self.report_every = report_every
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (response, expires_at)
+        self._bytes = 0
+        self._db = None
+        self.stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS ai_response_cache ('
+                'key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('DELETE FROM ai_response_cache WHERE expires_at < ?', (time.time(),))
+            self._db.commit()
+
+    def make_key(self, contents):
+        turns = [
+            (turn.get('role', 'user'), normalize_prompt(' '.join(part.get('text', '') for part in turn.get('parts', []))))
+            for turn in contents[-self.context_turns:]
+        ]
+        return hashlib.sha256(json.dumps(turns).encode()).hexdigest()
+
+    def _store(self, key, response, expires_at):
+        if key in self._entries:
+            self._bytes -= _size(self._entries.pop(key)[0])
+        self._entries[key] = (response, expires_at)
+        self._bytes += _size(response)
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            self.stats['evictions'] += 1
+
+    def get(self, contents):
+        key = self.make_key(contents)
+        now = time.time()
+
+        with self._lock:
+            response = self._lookup(key, now)
+            lookups = self.stats['hits'] + self.stats['misses']
+
+        if self.report_every and lookups % self.report_every == 0:
+            print(f"AI response cache: {self.metrics()}")
+        return response
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry and entry[1] > now:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['memory_hits'] += 1
+            return entry[0]
+        if entry:
+            self._bytes -= _size(self._entries.pop(key)[0])
+
+        if self._db is not None:
+            row = self._db.execute(
+                'SELECT response, expires_at FROM ai_response_cache WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row:
+                self._store(key, row[0], row[1])
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return row[0]
+
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, contents, response):
+        if not response or _size(response) > self.max_bytes:
+            return
+
+        key = self.make_key(contents)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._store(key, response, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO ai_response_cache (key, response, expires_at) VALUES (?, ?, ?)',
+                    (key, response, expires_at)
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM ai_response_cache')
+                self._db.commit()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else 0.0
+            )
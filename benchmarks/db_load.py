@@ -0,0 +1,186 @@
+"""Mixed read/write load: default SQLite vs the tuned settings in database.py.
+
+Readers page through the feed (newest posts joined to their authors) while
+writers cast votes: insert the vote and bump the post's counter in one
+transaction, like votes.cast_vote. Each mode gets its own throwaway SQLite
+file, so journal modes don't leak between runs. Doesn't touch the app's
+database.
+
+    python benchmarks/db_load.py --readers 8 --writers 2 --seconds 10
+
+With --url the same load runs against that database instead (e.g. a
+scratch PostgreSQL), using bench_* tables that are dropped afterwards.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+                        UniqueConstraint, create_engine, select)
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import apply_sqlite_pragmas, engine_options
+
+FEED_PAGE_SIZE = 20
+
+metadata = MetaData()
+users = Table(
+    'bench_user', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('username', String(80), nullable=False),
+    Column('avatar_url', String(200)),
+)
+posts = Table(
+    'bench_post', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('content', Text, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+    Column('user_id', String(36), ForeignKey('bench_user.id'), nullable=False),
+    Column('upvotes', Integer, nullable=False, default=0),
+    Index('ix_bench_post_created_at_id', 'created_at', 'id'),
+)
+votes = Table(
+    'bench_vote', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('user_id', String(36), nullable=False),
+    Column('post_id', String(36), nullable=False),
+    UniqueConstraint('user_id', 'post_id'),
+)
+
+def seed(engine, user_count, post_count, rng):
+    user_ids = [str(uuid.uuid4()) for _ in range(user_count)]
+    post_ids = [str(uuid.uuid4()) for _ in range(post_count)]
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(users.insert(), [
+            {'id': user_id, 'username': f'user{i}', 'avatar_url': '/static/default_avatar.jpg'}
+            for i, user_id in enumerate(user_ids)
+        ])
+        connection.execute(posts.insert(), [{
+            'id': post_id,
+            'content': f'post {i} ' + 'lorem ipsum ' * rng.randint(1, 20),
+            'created_at': start + timedelta(minutes=i),
+            'user_id': rng.choice(user_ids),
+            'upvotes': 0,
+        } for i, post_id in enumerate(post_ids)])
+    return user_ids, post_ids
+
+def run_load(engine, user_ids, post_ids, readers, writers, seconds):
+    feed = select(posts.c.id, posts.c.content, posts.c.upvotes, users.c.username, users.c.avatar_url) \
+        .join(users, users.c.id == posts.c.user_id) \
+        .order_by(posts.c.created_at.desc(), posts.c.id.desc()) \
+        .limit(FEED_PAGE_SIZE)
+    results = {'read': [], 'write': [], 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def reader():
+        samples = []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.execute(feed).all()
+            except OperationalError:
+                with lock:
+                    results['errors'] += 1
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+        with lock:
+            results['read'].extend(samples)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        samples = []
+        while time.monotonic() < deadline:
+            post_id = rng.choice(post_ids)
+            start = time.perf_counter()
+            try:
+                with engine.begin() as connection:
+                    connection.execute(votes.insert().values(
+                        id=str(uuid.uuid4()), user_id=rng.choice(user_ids), post_id=post_id
+                    ))
+                    connection.execute(
+                        posts.update().where(posts.c.id == post_id).values(upvotes=posts.c.upvotes + 1)
+                    )
+            except IntegrityError:
+                continue  # this user already voted on it
+            except OperationalError:
+                with lock:
+                    results['errors'] += 1
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+        with lock:
+            results['write'].extend(samples)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def report(name, results, seconds):
+    reads, writes = results['read'], results['write']
+    print(f"{name:10}{len(reads) / seconds:10.0f}{len(writes) / seconds:10.0f}"
+          f"{statistics.median(reads) if reads else float('nan'):10.2f}{percentile(reads, 0.99):10.2f}"
+          f"{statistics.median(writes) if writes else float('nan'):10.2f}{percentile(writes, 0.99):10.2f}"
+          f"{results['errors']:8}")
+
+def bench(name, engine, args):
+    metadata.create_all(engine)
+    try:
+        user_ids, post_ids = seed(engine, args.users, args.posts, random.Random(args.seed))
+        results = run_load(engine, user_ids, post_ids, args.readers, args.writers, args.seconds)
+    finally:
+        if args.url:
+            metadata.drop_all(engine)
+        engine.dispose()
+    report(name, results, args.seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='run against this database URL instead of SQLite files')
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per mode")
+    print(f"{'':10}{'reads/s':>10}{'writes/s':>10}{'read p50':>10}{'read p99':>10}"
+          f"{'write p50':>10}{'write p99':>10}{'errors':>8}  (latencies in ms)")
+
+    if args.url:
+        engine = create_engine(args.url, **engine_options(args.url))
+        apply_sqlite_pragmas(engine)
+        bench(engine.dialect.name, engine, args)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        default_url = f"sqlite:///{os.path.join(directory, 'default.db')}"
+        bench('default', create_engine(default_url), args)
+
+        tuned_url = f"sqlite:///{os.path.join(directory, 'tuned.db')}"
+        engine = create_engine(tuned_url, **engine_options(tuned_url))
+        apply_sqlite_pragmas(engine)
+        bench('tuned', engine, args)
+
+if __name__ == '__main__':
+    main()
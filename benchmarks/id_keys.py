@@ -0,0 +1,147 @@
+"""Index size and insert throughput for each primary key layout.
+
+Builds one throwaway SQLite database per layout with the posts/votes shape
+the app has (posts indexed on (created_at, id), votes indexed on post_id and
+unique on (user_id, post_id)), inserts the same rows in request-sized
+transactions, then reads every table's and index's size from dbstat.
+
+    uuid4 text   36-char random UUIDs, what every table used to have
+    uuid7 text   time-ordered UUIDs, still stored as text
+    uuid7 blob   time-ordered UUIDs as 16-byte blobs (COMPACT_IDS, the default)
+    integer      autoincrementing integers, for reference
+
+    python benchmarks/id_keys.py --posts 200000 --votes 400000
+
+Doesn't touch the app's database.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+                        create_engine, text)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import apply_sqlite_pragmas
+from ids import UUIDKey, new_id
+
+LAYOUTS = {
+    'uuid4 text': (lambda: String(36), lambda: str(uuid.uuid4())),
+    'uuid7 text': (lambda: String(36), new_id),
+    'uuid7 blob': (lambda: UUIDKey(compact=True), new_id),
+    'integer': (lambda: Integer, None),
+}
+
+def make_tables(key_type):
+    metadata = MetaData()
+    posts = Table(
+        'post', metadata,
+        Column('id', key_type(), primary_key=True),
+        Column('content', Text, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('user_id', String(36), nullable=False),
+        Index('ix_post_created_at_id', 'created_at', 'id'),
+    )
+    votes = Table(
+        'vote', metadata,
+        Column('id', key_type(), primary_key=True),
+        Column('post_id', key_type(), ForeignKey('post.id'), nullable=False),
+        Column('user_id', String(36), nullable=False),
+        Index('ix_vote_post_id', 'post_id'),
+        Index('uq_vote_user_post', 'user_id', 'post_id', unique=True),
+    )
+    return metadata, posts, votes
+
+def insert(engine, table, rows, make_id, batch):
+    """Insert rows batch at a time, one transaction each. Returns the ids used."""
+    ids = []
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        if make_id:
+            for row in chunk:
+                row['id'] = make_id()
+                ids.append(row['id'])
+        with engine.begin() as connection:
+            connection.execute(table.insert(), chunk)
+            if not make_id:
+                # Integer keys are assigned by SQLite, in order
+                last = connection.execute(text('SELECT last_insert_rowid()')).scalar()
+                ids.extend(range(last - len(chunk) + 1, last + 1))
+    return ids
+
+def sizes(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+
+def bench(path, layout, args):
+    key_type, make_id = LAYOUTS[layout]
+    engine = create_engine(f'sqlite:///{path}')
+    apply_sqlite_pragmas(engine)
+    metadata, posts, votes = make_tables(key_type)
+    metadata.create_all(engine)
+
+    rng = random.Random(args.seed)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(args.users)]
+    start_time = datetime(2024, 1, 1)
+    post_rows = [{
+        'content': 'lorem ipsum ' * rng.randint(1, 10),
+        'created_at': start_time + timedelta(seconds=i),
+        'user_id': rng.choice(user_ids),
+    } for i in range(args.posts)]
+
+    started = time.perf_counter()
+    post_ids = insert(engine, posts, post_rows, make_id, args.batch)
+    post_seconds = time.perf_counter() - started
+
+    pairs = set()
+    while len(pairs) < args.votes:
+        pairs.add((rng.choice(user_ids), rng.randrange(len(post_ids))))
+    vote_rows = [{'user_id': user_id, 'post_id': post_ids[index]} for user_id, index in pairs]
+
+    started = time.perf_counter()
+    insert(engine, votes, vote_rows, make_id, args.batch)
+    vote_seconds = time.perf_counter() - started
+
+    result = sizes(engine)
+    engine.dispose()
+    result['post rows/s'] = args.posts / post_seconds
+    result['vote rows/s'] = args.votes / vote_seconds
+    result['total'] = os.path.getsize(path)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--votes', type=int, default=400000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=100, help='rows per transaction')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for layout in LAYOUTS:
+            results[layout] = bench(os.path.join(directory, layout.replace(' ', '_') + '.db'), layout, args)
+
+    mb = lambda size: f"{(size or 0) / 1024 / 1024:.1f}"
+    columns = [
+        ('post rows/s', lambda r: f"{r['post rows/s']:.0f}"),
+        ('vote rows/s', lambda r: f"{r['vote rows/s']:.0f}"),
+        ('post pk MB', lambda r: mb(r.get('sqlite_autoindex_post_1'))),
+        ('post (created_at, id) MB', lambda r: mb(r.get('ix_post_created_at_id'))),
+        ('vote post_id MB', lambda r: mb(r.get('ix_vote_post_id'))),
+        ('vote (user, post) MB', lambda r: mb(r.get('uq_vote_user_post'))),
+        ('tables MB', lambda r: mb(r.get('post', 0) + r.get('vote', 0))),
+        ('file MB', lambda r: mb(r['total'])),
+    ]
+    print(f"{args.posts} posts, {args.votes} votes, {args.batch} rows per transaction")
+    print(f"{'':26}" + ''.join(f"{layout:>12}" for layout in LAYOUTS))
+    for name, value in columns:
+        print(f"{name:26}" + ''.join(f"{value(results[layout]):>12}" for layout in LAYOUTS))
+
+if __name__ == '__main__':
+    main()
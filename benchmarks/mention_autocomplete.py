@@ -0,0 +1,110 @@
+"""Compare @mention autocomplete lookups: the old ILIKE scan vs UsernameIndex.
+
+Builds a throwaway SQLite database with synthetic users, then times the
+query /api/search-users used to run against UsernameIndex.complete() for
+the same prefixes. Doesn't touch the app's database.
+
+    python benchmarks/mention_autocomplete.py --users 100000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+import uuid
+from sqlalchemy import Column, MetaData, String, Table, create_engine, or_, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from usernames import UsernameIndex
+
+metadata = MetaData()
+users = Table(
+    'user', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('avatar_url', String(200)),
+)
+
+def random_username(rng):
+    syllables = ['an', 'ba', 'ki', 'lo', 'mi', 'no', 'ra', 'sa', 'ta', 'zu', 'el', 'jo']
+    name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+    return name + ''.join(rng.choice(string.digits) for _ in range(rng.randint(0, 4)))
+
+def seed(engine, count, rng):
+    names = set()
+    while len(names) < count:
+        names.add(random_username(rng))
+    rows = [{
+        'id': str(uuid.uuid4()),
+        'username': name,
+        'email': f'{name}@school.edu',
+        'avatar_url': '/static/default_avatar.jpg'
+    } for name in names]
+    with engine.begin() as connection:
+        connection.execute(users.insert(), rows)
+    return sorted(names)
+
+def timed(func, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean': statistics.mean(samples),
+        'p50': samples[len(samples) // 2],
+        'p95': samples[int(len(samples) * 0.95) - 1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        metadata.create_all(engine)
+        names = seed(engine, args.users, rng)
+        queries = [name[:rng.randint(2, 4)] for name in rng.choices(names, k=args.queries)]
+
+        def ilike(query):
+            # What /api/search-users ran before the index
+            with engine.connect() as connection:
+                return connection.execute(
+                    select(users.c.id, users.c.username, users.c.avatar_url)
+                    .where(or_(users.c.username.ilike(f'%{query}%'), users.c.email.ilike(f'%{query}%')))
+                    .limit(10)
+                ).all()
+
+        def load():
+            with engine.connect() as connection:
+                return connection.execute(select(users.c.id, users.c.username, users.c.avatar_url)).all()
+
+        index = UsernameIndex(load)
+        start = time.perf_counter()
+        index.build()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        results = {
+            'ilike scan': timed(ilike, queries),
+            'UsernameIndex': timed(lambda query: index.complete(query, limit=10), queries),
+        }
+        engine.dispose()
+
+    print(f"{args.users} users, {args.queries} prefix queries, index built in {build_ms:.0f} ms")
+    print(f"{'':15}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:15}{stats['mean']:10.3f}{stats['p50']:10.3f}{stats['p95']:10.3f}")
+    speedup = results['ilike scan']['mean'] / results['UsernameIndex']['mean']
+    print(f"UsernameIndex is {speedup:.0f}x faster on average")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+from sqlalchemy import event
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a
+# vote or notification is being written (the default rollback journal locks
+# the whole file), and NORMAL sync is safe under WAL: a power cut can lose the
+# last commits but never corrupts the database.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms to wait for a writer's lock instead of failing with "database is locked"
+    'cache_size': -64000,  # negative is KiB, so 64MB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+def database_url(url):
+    # Heroku and friends still hand out postgres://, which SQLAlchemy dropped
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800):
+    """SQLAlchemy create_engine() keyword arguments for url.
+
+    Both backends get a QueuePool of pool_size connections plus up to
+    max_overflow extra under load. Server databases also recycle connections
+    older than pool_recycle seconds and ping them on checkout, so a restarted
+    PostgreSQL or a dropped idle connection isn't a failed request.
+    """
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+    }
+    if url.startswith('sqlite'):
+        if ':memory:' in url or url.rstrip('/') == 'sqlite:':
+            return {}  # a single shared connection, nothing to pool
+        return options
+    options['pool_recycle'] = pool_recycle
+    options['pool_pre_ping'] = True
+    return options
+
+def apply_sqlite_pragmas(engine, pragmas=SQLITE_PRAGMAS):
+    """Run PRAGMA name = value on every connection engine opens. No-op off SQLite."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
@@ -0,0 +1,207 @@
+import json
+import random
+from contextlib import contextmanager
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class GeminiError(Exception):
+    pass
+
+class GeminiUnavailable(GeminiError):
+    """Raised without calling upstream: the breaker is open or every slot is busy."""
+    pass
+
+class GeminiRejected(GeminiError):
+    """Upstream answered but refused our request (a 4xx), so it is healthy."""
+    pass
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing.
+
+    After failure_threshold consecutive failures the breaker opens and every
+    call fails fast for reset_timeout seconds. Then a single trial call is let
+    through: success closes the breaker, failure opens it again, and a trial
+    abandoned by its caller (release_trial) lets the next call try instead.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        # The call ended without telling us anything about upstream's health
+        with self._lock:
+            self._trial_running = False
+
+class GeminiClient:
+    """Pooled, bounded client for the Gemini generateContent API.
+
+    One keep-alive requests.Session is shared by every request thread. Each
+    call has connect/read timeouts and retries transient errors with jittered
+    exponential backoff. At most max_concurrency calls are in flight, and a
+    circuit breaker fails fast while upstream is down. base_url can point at
+    a local stub server in tests.
+    """
+
+    def __init__(self, api_key, base_url, model, timeout=(3.05, 30), max_retries=2,
+                 backoff=0.5, max_concurrency=8, queue_timeout=2, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, method='generateContent'):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise GeminiUnavailable("Too many concurrent Gemini requests")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise GeminiUnavailable("Gemini circuit breaker is open")
+
+    @contextmanager
+    def _guarded(self):
+        """Hold a concurrency slot around one call and report its outcome to the breaker.
+
+        Exactly one outcome is recorded, in a finally, so a half-open trial
+        always ends. Anything that escapes counts as a failure and a
+        GeminiRejected as success. GeneratorExit from a stream whose reader
+        went away says nothing about upstream, so it only ends the trial.
+        """
+        self._acquire()
+        healthy = False
+        abandoned = False
+        try:
+            yield
+            healthy = True
+        except GeminiRejected:
+            healthy = True
+            raise
+        except GeneratorExit:
+            abandoned = True
+            raise
+        finally:
+            if healthy:
+                self.breaker.record_success()
+            elif abandoned:
+                self.breaker.release_trial()
+            else:
+                self.breaker.record_failure()
+            self._slots.release()
+
+    def _send(self, method, payload, stream=False, params=None):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._sleep_before_retry(attempt - 1)
+            try:
+                response = self.session.post(
+                    self.url(method),
+                    params=dict(params or {}, key=self.api_key),
+                    json=payload,
+                    timeout=self.timeout,
+                    stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = GeminiError(f"Gemini request failed: {e}")
+                continue
+            except requests.RequestException as e:
+                # Not transient (bad URL, too many redirects, ...), retrying won't help
+                raise GeminiError(f"Gemini request failed: {e}")
+
+            if response.status_code == 200:
+                return response
+
+            error = GeminiError(f"Gemini API error: {response.status_code} - {response.text[:500]}")
+            response.close()
+            if response.status_code not in RETRY_STATUSES:
+                # Our request is wrong; upstream is healthy, so don't trip the breaker
+                raise GeminiRejected(str(error))
+
+        raise error
+
+    def request(self, method, payload):
+        """POST payload to a model method and return the successful response.
+
+        Raises GeminiUnavailable when the call is refused locally and
+        GeminiError when upstream fails after all retries.
+        """
+        with self._guarded():
+            return self._send(method, payload)
+
+    def generate(self, contents, **options):
+        """Run generateContent and return the text of the first candidate."""
+        payload = dict(options, contents=contents)
+        response_data = self.request('generateContent', payload).json()
+        return response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+
+    def stream_generate(self, contents, **options):
+        """Yield text chunks from streamGenerateContent as they arrive.
+
+        The concurrency slot is held until the stream is finished or closed.
+        A stream closed early by its reader doesn't count for or against the
+        circuit breaker.
+        """
+        payload = dict(options, contents=contents)
+        with self._guarded():
+            try:
+                response = self._send('streamGenerateContent', payload, stream=True, params={'alt': 'sse'})
+                with response:
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if not line or not line.startswith('data:'):
+                            continue
+                        chunk = json.loads(line[len('data:'):])
+                        text = chunk.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+                        if text:
+                            yield text
+            except (requests.RequestException, ValueError) as e:
+                # Upstream died or sent garbage mid-stream
+                raise GeminiError(f"Gemini stream failed: {e}")
@@ -0,0 +1,126 @@
+import io
+import re
+from PIL import Image, ImageOps
+from app import app
+
+# Widths generated for post images, never upscaled past the original
+IMAGE_WIDTHS = (320, 640, 960, 1280)
+# Square avatar thumbnails, 1x and 2x for the 40px, 30px and 150px avatars
+AVATAR_SIZES = (48, 96, 160, 320)
+IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# <base>-<width>.jpg for posts, <base>-avatar-<size>.jpg for avatars
+VARIANT_RE = re.compile(r'^(?P<base>.+?)-(?P<avatar>avatar-)?(?P<width>\d+)\.(?:jpg|webp)$')
+
+class InvalidImage(ValueError):
+    pass
+
+def open_image(file, max_side):
+    """Open and validate an upload, returning an upright RGB/RGBA image.
+
+    The real format comes from the file's bytes, not its name. Large JPEGs
+    are decoded at reduced scale (draft mode) when max_side allows it, so a
+    16MB photo never needs to be decoded at full resolution.
+    """
+    try:
+        image = Image.open(file)
+        if image.format not in IMAGE_FORMATS:
+            raise InvalidImage(f"Unsupported image format: {image.format}")
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImage(f"Not a valid image: {e}")
+
+    # Converting drops EXIF, ICC, comments and the rest of the metadata
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or \
+        (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode == 'RGBA':
+            # JPEG has no alpha channel, flatten onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def image_variants(image):
+    """Yield (width, resized image) for each width in IMAGE_WIDTHS that fits."""
+    widths = [width for width in IMAGE_WIDTHS if width < image.width]
+    widths.append(min(image.width, IMAGE_WIDTHS[-1]))
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        yield width, image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+def avatar_variants(image):
+    square = ImageOps.fit(image, (AVATAR_SIZES[-1], AVATAR_SIZES[-1]), Image.LANCZOS)
+    for size in AVATAR_SIZES:
+        yield size, square.resize((size, size), Image.LANCZOS)
+
+def process_image(file, kind='post'):
+    """Validate an upload and render its WebP and JPEG variants.
+
+    Returns a list of (suffix, data), e.g. ('-640.webp', b'...'); the caller
+    prefixes a name and stores them. The largest JPEG comes last, its URL is
+    what gets stored on the post or user and the rest are found from it.
+    Raises InvalidImage if the upload isn't an image we accept.
+    """
+    if kind == 'avatar':
+        image = open_image(file, AVATAR_SIZES[-1])
+        variants = avatar_variants(image)
+        suffix = '-avatar-{width}.{fmt}'
+    else:
+        image = open_image(file, IMAGE_WIDTHS[-1])
+        variants = image_variants(image)
+        suffix = '-{width}.{fmt}'
+
+    return [(suffix.format(width=width, fmt=fmt), encode(variant, fmt))
+            for width, variant in variants
+            for fmt in ('webp', 'jpg')]
+
+def _variant_widths(url):
+    # Returns (base, is_avatar, widths) for a processed upload, None for anything else
+    match = VARIANT_RE.match(url or '')
+    if not match:
+        return None
+    largest = int(match.group('width'))
+    if match.group('avatar'):
+        return match.group('base'), True, [size for size in AVATAR_SIZES if size <= largest]
+    return match.group('base'), False, [width for width in IMAGE_WIDTHS if width < largest] + [largest]
+
+def variant_urls(url):
+    """Every variant URL (both formats) of a processed upload, [] for anything else."""
+    variants = _variant_widths(url)
+    if not variants:
+        return []
+    base, is_avatar, widths = variants
+    infix = '-avatar-' if is_avatar else '-'
+    return [f'{base}{infix}{width}.{fmt}' for width in widths for fmt in ('webp', 'jpg')]
+
+@app.template_filter('srcset')
+def srcset(url, fmt='jpg'):
+    """srcset for a post image, e.g. `<img srcset="{{ post.image_url|srcset }}">`."""
+    variants = _variant_widths(url)
+    if not variants or variants[1]:
+        return ''
+    base, _, widths = variants
+    return ', '.join(f'{base}-{width}.{fmt} {width}w' for width in widths)
+
+@app.template_filter('avatar_thumb')
+def avatar_thumb(url, size, fmt='jpg'):
+    """URL of the smallest avatar thumbnail at least size pixels wide."""
+    variants = _variant_widths(url)
+    if not variants or not variants[1]:
+        return url
+    base, _, sizes = variants
+    size = next((s for s in sizes if s >= size), sizes[-1])
+    return f'{base}-avatar-{size}.{fmt}'
@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+import traceback
+from datetime import timedelta
+import click
+from sqlalchemy import and_, event, or_
+from app import app, db, Job, get_est_time, dialect_insert
+
+HANDLERS = {}
+
+def job(name):
+    """Register a function as the handler for jobs called name."""
+    def register(func):
+        HANDLERS[name] = func
+        return func
+    return register
+
+def enqueue(name, key=None, **payload):
+    """Queue a job as part of the caller's transaction.
+
+    Nothing runs until the caller commits, and a rollback drops the job along
+    with everything else. Jobs sharing a key are only queued once, so a
+    retried request can't schedule the same side effect twice.
+    """
+    stmt = dialect_insert(Job.__table__).values(
+        name=name,
+        key=key,
+        payload=json.dumps(payload)
+    ).on_conflict_do_nothing(index_elements=['key'])
+    db.session.execute(stmt)
+    db.session.info['jobs_queued'] = True
+
+class JobWorker:
+    """Runs queued jobs from the job table on background threads.
+
+    Jobs are claimed with a conditional UPDATE, so any number of threads and
+    processes (see `flask run-jobs`) can share one table. A failing job is
+    retried with exponential backoff up to max_attempts times and then left
+    as 'failed' with its traceback. A job whose worker died mid-run is picked
+    up again after lock_timeout seconds, so handlers must be idempotent.
+    """
+
+    def __init__(self, threads=2, poll_interval=1.0, max_attempts=5, backoff=5,
+                 lock_timeout=300, batch_size=10, keep_done=24 * 3600):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lock_timeout = lock_timeout
+        self.batch_size = batch_size
+        self.keep_done = keep_done
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._last_prune = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.threads):
+                thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                with app.app_context():
+                    ran = self.run_pending()
+                    self.prune()
+            except Exception:
+                traceback.print_exc()
+                ran = 0
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _runnable(self, now):
+        stale = now - timedelta(seconds=self.lock_timeout)
+        return or_(
+            and_(Job.status == 'pending', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_at < stale)
+        )
+
+    def claim(self):
+        """Take up to batch_size due jobs for this worker."""
+        now = get_est_time()
+        candidates = [job_id for (job_id,) in db.session.query(Job.id)
+                      .filter(self._runnable(now))
+                      .order_by(Job.run_at)
+                      .limit(self.batch_size)]
+
+        claimed = []
+        for job_id in candidates:
+            taken = db.session.query(Job).filter(Job.id == job_id, self._runnable(now)).update({
+                Job.status: 'running',
+                Job.locked_at: now,
+                Job.attempts: Job.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if taken:
+                claimed.append(job_id)
+        return claimed
+
+    def run_pending(self):
+        """Run every job this worker can claim right now. Returns how many ran."""
+        claimed = self.claim()
+        for job_id in claimed:
+            self.run(db.session.get(Job, job_id))
+        return len(claimed)
+
+    def run(self, queued):
+        handler = HANDLERS.get(queued.name)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {queued.name!r}")
+            handler(**json.loads(queued.payload))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            if queued.attempts >= self.max_attempts:
+                changes = {Job.status: 'failed', Job.last_error: error}
+            else:
+                delay = self.backoff * 2 ** (queued.attempts - 1)
+                changes = {
+                    Job.status: 'pending',
+                    Job.run_at: get_est_time() + timedelta(seconds=delay),
+                    Job.last_error: error
+                }
+            db.session.query(Job).filter(Job.id == queued.id).update(changes, synchronize_session=False)
+            db.session.commit()
+            return False
+
+        db.session.query(Job).filter(Job.id == queued.id).update(
+            {Job.status: 'done', Job.locked_at: None}, synchronize_session=False
+        )
+        db.session.commit()
+        return True
+
+    def prune(self):
+        """Delete finished jobs once they are older than keep_done, at most once a minute."""
+        if time.monotonic() - self._last_prune < 60:
+            return
+        self._last_prune = time.monotonic()
+        cutoff = get_est_time() - timedelta(seconds=self.keep_done)
+        db.session.query(Job).filter(Job.status == 'done', Job.run_at < cutoff) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+worker = JobWorker(
+    threads=app.config['JOB_WORKER_THREADS'],
+    poll_interval=app.config['JOB_POLL_INTERVAL'],
+    max_attempts=app.config['JOB_MAX_ATTEMPTS']
+)
+
+@event.listens_for(db.session, 'after_commit')
+def wake_job_worker(session):
+    # Start on queued work right away instead of waiting for the next poll
+    if session.info.pop('jobs_queued', False):
+        worker.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_queued_jobs(session):
+    session.info.pop('jobs_queued', None)
+
+@app.before_request
+def start_job_worker():
+    # Only processes that serve requests run the in-process workers
+    if app.config['JOB_WORKER_THREADS']:
+        worker.start()
+
+@app.cli.command('run-jobs')
+@click.option('--threads', default=2, show_default=True, help='Worker threads.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due now and exit.')
+def run_jobs(threads, once):
+    """Run queued background jobs outside the web process."""
+    if once:
+        ran = 0
+        while True:
+            count = worker.run_pending()
+            if not count:
+                break
+            ran += count
+        click.echo(f'Ran {ran} job(s)')
+        return
+
+    worker.threads = threads
+    worker.start()
+    click.echo(f'Running jobs on {threads} thread(s), Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
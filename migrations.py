@@ -0,0 +1,128 @@
+import click
+from sqlalchemy import text
+from app import app, db, get_est_time
+from votes import dedupe_votes, recount_votes
+from ids import UUIDKey, id_to_bytes, id_to_str
+
+# Additive schema changes (new tables, columns and indexes declared on the
+# models) are applied at startup by create_all/add_missing_columns/
+# create_missing_indexes. Everything else a release needs done to existing
+# data - backfills, dedupes, rewrites - is a numbered migration here, run
+# once per database in version order and recorded in schema_migrations.
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register func as migration number version. It must leave the session committed."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+def applied_versions():
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+    ))
+    db.session.commit()
+    return {version for (version,) in db.session.execute(text('SELECT version FROM schema_migrations'))}
+
+def pending_migrations():
+    applied = applied_versions()
+    return [item for item in MIGRATIONS if item[0] not in applied]
+
+def run_migrations():
+    """Apply every pending migration in order. Returns the versions applied."""
+    applied = []
+    for version, description, func in pending_migrations():
+        try:
+            func()
+            db.session.execute(
+                text('INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :applied_at)'),
+                {'version': version, 'description': description, 'applied_at': get_est_time()}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+def convert_id_storage():
+    """Rewrite UUIDKey columns still stored the other way after COMPACT_IDS changes.
+
+    SQLite never finds a blob equal to text, so every key column has to hold
+    a single format before anything looks rows up by id. All columns are
+    converted in one transaction. Returns (table, column, rows) for each
+    column that changed.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    compact = app.config['COMPACT_IDS']
+    driver_connection = db.session.connection().connection.driver_connection
+    driver_connection.create_function('id_to_bytes', 1, id_to_bytes, deterministic=True)
+    driver_connection.create_function('id_to_str', 1, id_to_str, deterministic=True)
+
+    converted = []
+    for table in db.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, UUIDKey):
+                continue
+            # SQLite sorts all text before all blobs, so on an indexed key
+            # finding the rows in the wrong format is a range lookup, not a scan
+            if compact:
+                convert, wrong_format = 'id_to_bytes', f'"{column.name}" < X\'\''
+            else:
+                convert, wrong_format = 'id_to_str', f'"{column.name}" >= X\'\''
+            result = db.session.execute(text(
+                f'UPDATE "{table.name}" SET "{column.name}" = {convert}("{column.name}") WHERE {wrong_format}'
+            ))
+            if result.rowcount:
+                converted.append((table.name, column.name, result.rowcount))
+    db.session.commit()
+
+    for table_name, column_name, rows in converted:
+        print(f"Converted {rows} {table_name}.{column_name} keys to {'blobs' if compact else 'text'}")
+    return converted
+
+@migration(1, 'Remove duplicate votes and recount vote counters')
+def dedupe_votes_and_recount():
+    # Older databases can hold duplicate votes that would block the unique vote indexes
+    dedupe_votes()
+    recount_votes()
+
+@migration(2, 'Backfill Group.member_count')
+def backfill_group_member_counts():
+    db.session.execute(text(
+        'UPDATE "group" SET member_count = '
+        '(SELECT COUNT(*) FROM group_members WHERE group_members.group_id = "group".id)'
+    ))
+    db.session.commit()
+
+@migration(3, 'Backfill User.unread_notifications')
+def backfill_unread_notification_counts():
+    db.session.execute(text(
+        'UPDATE "user" SET unread_notifications = '
+        '(SELECT COUNT(*) FROM notification WHERE notification.user_id = "user".id AND notification.is_read = :is_read)'
+    ), {'is_read': False})
+    db.session.commit()
+
+@migration(4, 'Drop ix_group_member_count, replaced by ix_group_member_count_id')
+def drop_group_member_count_index():
+    db.session.execute(text('DROP INDEX IF EXISTS ix_group_member_count'))
+    db.session.commit()
+
+@app.cli.command('migrate')
+def migrate():
+    """Apply pending data migrations (also done on every startup)."""
+    converted = convert_id_storage()
+    if not run_migrations() and not converted:
+        click.echo('Database is up to date')
+
+@app.cli.command('migrations')
+def list_migrations():
+    """Show every migration and whether it has been applied."""
+    applied = applied_versions()
+    for version, description, _ in MIGRATIONS:
+        click.echo(f"{'x' if version in applied else ' '} {version:04d} {description}")
@@ -0,0 +1,161 @@
+from sqlalchemy import tuple_, and_
+from sqlalchemy.orm import joinedload
+import base64
+import binascii
+from datetime import datetime
+from app import db, User, Post, Group, GroupPost, Notification, AiConversation, AiMessage, group_members
+
+FEED_PAGE_SIZE = 20
+GROUPS_PAGE_SIZE = 24
+NOTIFICATIONS_PAGE_SIZE = 20
+AI_MESSAGES_PAGE_SIZE = 30
+AI_CONVERSATIONS_PAGE_SIZE = 20
+
+# Cursor helpers
+def encode_cursor(created_at, item_id):
+    raw = f"{created_at.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, item_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), item_id
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+def encode_groups_cursor(member_count, group_id):
+    raw = f"{member_count}|{group_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_groups_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        member_count, group_id = raw.split('|', 1)
+        return int(member_count), group_id
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+def keyset_page(query, model, cursor=None, limit=FEED_PAGE_SIZE):
+    """Page through query newest first on (created_at, id).
+
+    The cursor is the (created_at, id) of the last row already shown, so each
+    page is a range scan on a (created_at, id) index no matter how deep we are.
+    Returns the rows and the cursor for the next page (None on the last page).
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    if cursor:
+        created_at, item_id = cursor
+        query = query.filter(tuple_(model.created_at, model.id) < (created_at, item_id))
+
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
+
+# Loaders
+# Templates render post.user on every row, so every loader pulls the author in
+# with the same SELECT instead of one lazy load per post.
+def get_feed_page(cursor=None, limit=FEED_PAGE_SIZE):
+    """Return one page of posts, newest first, and the cursor for the next page."""
+    query = Post.query.options(joinedload(Post.user))
+    return keyset_page(query, Post, cursor, limit)
+
+def get_profile_posts(user_id):
+    return Post.query.options(joinedload(Post.user)) \
+        .filter_by(user_id=user_id) \
+        .order_by(Post.created_at.desc(), Post.id.desc()) \
+        .all()
+
+def get_group_posts(group_id):
+    return GroupPost.query.options(joinedload(GroupPost.user)) \
+        .filter_by(group_id=group_id) \
+        .order_by(GroupPost.created_at.desc(), GroupPost.id.desc()) \
+        .all()
+
+def get_group_members(group_id):
+    """Return (user, is_admin) for every member of a group."""
+    return db.session.query(User, group_members.c.is_admin) \
+        .join(group_members, User.id == group_members.c.user_id) \
+        .filter(group_members.c.group_id == group_id) \
+        .all()
+
+def group_row(row, is_member=False):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'icon': row.icon,
+        'description': row.description,
+        'members_count': row.member_count or 0,
+        'is_member': is_member,
+        'is_admin': bool(is_member and row.is_admin)
+    }
+
+def get_groups_page(user_id=None, search=None, cursor=None, per_page=GROUPS_PAGE_SIZE):
+    """Return the viewer's groups, one page of other groups, and the next cursor.
+
+    The viewer's groups come through the group_members primary key (user_id
+    first), with is_admin from the same row, and only on the first page.
+    Other groups are walked biggest first on ix_group_member_count_id, with a
+    (member_count, id) cursor, skipping those the viewer has joined. Neither
+    query sorts or scans the whole group table however many clubs there are.
+    """
+    columns = (Group.id, Group.name, Group.icon, Group.description, Group.member_count)
+    search_filter = Group.name.ilike(f'%{search}%') if search else None
+
+    user_groups = []
+    if user_id and cursor is None:
+        query = db.session.query(*columns, group_members.c.is_admin) \
+            .join(group_members, group_members.c.group_id == Group.id) \
+            .filter(group_members.c.user_id == user_id)
+        if search_filter is not None:
+            query = query.filter(search_filter)
+        rows = query.order_by(Group.member_count.desc(), Group.id.desc()).all()
+        user_groups = [group_row(row, is_member=True) for row in rows]
+
+    query = db.session.query(*columns)
+    if user_id:
+        query = query.outerjoin(
+            group_members,
+            and_(group_members.c.group_id == Group.id, group_members.c.user_id == user_id)
+        ).filter(group_members.c.user_id.is_(None))
+    if search_filter is not None:
+        query = query.filter(search_filter)
+    if cursor:
+        query = query.filter(tuple_(Group.member_count, Group.id) < cursor)
+    rows = query.order_by(Group.member_count.desc(), Group.id.desc()) \
+        .limit(per_page + 1) \
+        .all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_groups_cursor(rows[-1].member_count, rows[-1].id)
+
+    return user_groups, [group_row(row) for row in rows], next_cursor
+
+def get_notifications_page(user_id, cursor=None, limit=NOTIFICATIONS_PAGE_SIZE):
+    """Return one page of a user's notifications, newest first, and the next cursor."""
+    query = Notification.query.options(
+        joinedload(Notification.sender),
+        joinedload(Notification.group_post)
+    ).filter(Notification.user_id == user_id)
+    return keyset_page(query, Notification, cursor, limit)
+
+def get_ai_messages_page(conversation_id, cursor=None, limit=AI_MESSAGES_PAGE_SIZE):
+    """Return the newest window of a conversation before cursor, oldest first for display.
+
+    The returned cursor points at the next (earlier) window.
+    """
+    query = AiMessage.query.filter(AiMessage.conversation_id == conversation_id)
+    messages, next_cursor = keyset_page(query, AiMessage, cursor, limit)
+    return messages[::-1], next_cursor
+
+def get_ai_conversations_page(user_id, cursor=None, limit=AI_CONVERSATIONS_PAGE_SIZE):
+    query = AiConversation.query.filter(AiConversation.user_id == user_id)
+    return keyset_page(query, AiConversation, cursor, limit)
@@ -1,20 +1,27 @@
-import os
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context, send_file
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from datetime import datetime
 import uuid
-from app import app, db, User, Post, Vote, Group, GroupPost, AiConversation, AiMessage, generate_ai_response, group_members, Tag, Notification
+from app import app, db, User, Post, Vote, Group, GroupPost, AiConversation, AiMessage, generate_ai_response, stream_ai_response, recent_history, refresh_conversation_summary, group_members, Notification, invalidate_popular_groups, get_est_time, get_storage, username_index
+from votes import cast_vote, VOTE_TYPES
+from queries import get_feed_page, get_profile_posts, get_group_posts, get_group_members, get_groups_page, get_notifications_page, get_ai_messages_page, get_ai_conversations_page, decode_cursor, decode_groups_cursor
+from trending import trending_tags, extract_hashtags
+from jobs import job, enqueue
+from images import InvalidImage
+from uploads import store_image, release_image
+from storage import content_type
+from subjects import classify_subject
+from search import find_users, find_posts
 import re
-from collections import Counter
+from sqlalchemy import tuple_
 
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import random
-import uuid
+import json
 
 # Initialize SocketIO with your Flask app
-socketio = SocketIO(app)
+socketio = SocketIO(app, message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
 
 # Anonymous name generation
 animal_names = ["Penguin", "Giraffe", "Koala", "Tiger", "Dolphin", "Eagle", "Fox", "Panda"]
@@ -23,6 +30,30 @@ colors = ["Red", "Blue", "Green", "Purple", "Orange", "Teal", "Pink", "Yellow"]
 # Store for active anonymous users
 anonymous_users = {}
 
+# Per-user rooms so notification counts can be pushed to every open tab
+def user_room(user_id):
+    return f"user:{user_id}"
+
+@socketio.on('connect')
+def on_connect():
+    if current_user.is_authenticated:
+        join_room(user_room(current_user.id))
+
+def push_unread_counts(user_ids):
+    """Send each user's current unread notification count to their open tabs."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    
+    counts = dict(
+        db.session.query(User.id, User.unread_notifications)
+        .filter(User.id.in_(user_ids))
+        .all()
+    )
+    
+    for user_id in user_ids:
+        socketio.emit('unread_count', {'count': counts.get(user_id, 0)}, room=user_room(user_id))
+
 @app.route('/anonymous_chat')
 @login_required
 def anonymous_chat():
@@ -80,54 +111,220 @@ def reset_anonymous_identity():
 # Helper functions
 def allowed_file(filename):
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
+           filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+def save_image(file, kind='post'):
+    """Resize, recompress and store an uploaded image, see uploads.store_image.
 
-def save_image(file):
+    Returns the stored URL, or None if the upload isn't a usable image.
+    """
     if not file:
         return None
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"{uuid.uuid4()}_{file.filename}")
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        return '/static/uploads/' + filename
+        try:
+            return store_image(file.stream, kind)
+        except InvalidImage:
+            return None
     return None
 
-def process_mentions(content, post=None, group_post=None):
-    if not content:
+@app.route('/media/<path:filename>')
+def media(filename):
+    # Names are content hashes, so a URL's bytes never change: cache forever
+    etag = filename
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        try:
+            media_file = get_storage().open(filename)
+        except FileNotFoundError:
+            return render_template('404.html'), 404
+        response = send_file(
+            media_file,
+            mimetype=content_type(filename),
+            max_age=app.config['MEDIA_MAX_AGE'],
+            etag=etag
+        )
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['MEDIA_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+MENTION_RE = re.compile(r'@(\w+)')
+
+def queue_mentions(content, post_id=None, group_post_id=None):
+    """Queue mention notifications for content; the caller's commit releases the job."""
+    if not content or not MENTION_RE.search(content):
         return
     
-    print(f"Processing mentions in: {content}")
+    target = f"post:{post_id}" if post_id else f"group_post:{group_post_id}" if group_post_id else None
+    enqueue(
+        'mentions',
+        key=f"mentions:{target}" if target else None,
+        content=content,
+        author_id=current_user.id,
+        post_id=post_id,
+        group_post_id=group_post_id
+    )
+
+@job('mentions')
+def process_mentions(content, author_id, post_id=None, group_post_id=None):
+    """Notify every user @mentioned in content.
+
+    Runs as a background job. Users who already have a mention notification
+    for the post are skipped, so a retried job doesn't notify anyone twice.
+    """
+    author = db.session.get(User, author_id)
+    if not author or not content:
+        return
     
-    mentions = re.findall(r'@(\w+)', content)
-    print(f"Found mentions: {mentions}")
+    # The post may have been deleted before the job ran
+    if post_id and not db.session.get(Post, post_id):
+        return
+    if group_post_id and not db.session.get(GroupPost, group_post_id):
+        return
     
-    for username in mentions:
-        mentioned_user = User.query.filter_by(username=username).first()
-        
-        if mentioned_user and mentioned_user.id != current_user.id:
-            print(f"Creating notification for user: {mentioned_user.username} (ID: {mentioned_user.id})")
-            post_type = "post" if post else "group post"
-            notification_text = f"{current_user.username} mentioned you in a {post_type}"
-            
-            new_notification = Notification(
-                user_id=mentioned_user.id,
-                sender_id=current_user.id,
-                content=notification_text,
-                post_id=post.id if post else None,
-                group_post_id=group_post.id if group_post else None,
-                notification_type='mention'
-            )
-            
-            db.session.add(new_notification)
-        elif not mentioned_user:
-            print(f"User not found: @{username}")
-        elif mentioned_user.id == current_user.id:
-            print(f"Skipping self-mention: @{username}")
+    usernames = set(MENTION_RE.findall(content))
+    usernames.discard(author.username)
+    if not usernames:
+        return
     
-    if mentions:
-        db.session.commit()
-        print("Committed notifications to database")
+    query = db.session.query(User.id).filter(User.username.in_(usernames))
+    if post_id or group_post_id:
+        already_notified = db.session.query(Notification.user_id).filter(
+            Notification.notification_type == 'mention',
+            Notification.post_id == post_id,
+            Notification.group_post_id == group_post_id
+        )
+        query = query.filter(User.id.notin_(already_notified))
+    mentioned_ids = [user_id for (user_id,) in query]
+    if not mentioned_ids:
+        return
+    
+    post_type = "group post" if group_post_id else "post"
+    notification_text = f"{author.username} mentioned you in a {post_type}"
+    
+    db.session.execute(Notification.__table__.insert(), [{
+        'user_id': user_id,
+        'sender_id': author.id,
+        'content': notification_text,
+        'post_id': post_id,
+        'group_post_id': group_post_id,
+        'notification_type': 'mention'
+    } for user_id in mentioned_ids])
+    User.query.filter(User.id.in_(mentioned_ids)).update(
+        {User.unread_notifications: User.unread_notifications + 1}, synchronize_session=False
+    )
+    db.session.commit()
+    
+    push_unread_counts(mentioned_ids)
+
+def mark_notifications_read(user_id, up_to=None):
+    """Mark a user's unread notifications read with a single UPDATE.
+
+    With up_to, a (created_at, id) cursor, only notifications at or before it
+    are marked, so anything that arrived after the user loaded the page stays
+    unread. Returns how many notifications were marked.
+    """
+    query = Notification.query.filter(Notification.user_id == user_id, Notification.is_read == False)
+    if up_to:
+        created_at, notification_id = up_to
+        query = query.filter(tuple_(Notification.created_at, Notification.id) <= (created_at, notification_id))
+    
+    marked = query.update({Notification.is_read: True}, synchronize_session=False)
+    if not marked:
+        db.session.rollback()
+        return 0
+    
+    unread = User.unread_notifications - marked if up_to else 0
+    User.query.filter_by(id=user_id).update({User.unread_notifications: unread}, synchronize_session=False)
+    db.session.commit()
+    
+    push_unread_counts([user_id])
+    return marked
+
+@job('upvote_notification')
+def notify_upvote(voter_id, post_id=None, group_post_id=None):
+    """Keep a single "N people upvoted your post" notification per post up to date.
+
+    Queued by cast_vote whenever an upvote is added or taken back. The text
+    is rebuilt from the upvotes still standing, naming the most recent of
+    those voters, so a retracted upvote drops out of it (and the last one
+    retracted removes the notification). Running the job twice leaves the
+    same notification behind.
+    """
+    target = db.session.get(Post, post_id) if post_id else db.session.get(GroupPost, group_post_id)
+    if not target or target.user_id == voter_id:
+        return
+    
+    target_column = Vote.post_id if post_id else Vote.group_post_id
+    upvoters = db.session.query(User) \
+        .join(Vote, Vote.user_id == User.id) \
+        .filter(target_column == target.id, Vote.vote_type == 'upvote', Vote.user_id != target.user_id) \
+        .order_by(Vote.created_at.desc(), Vote.id.desc())
+    latest = upvoters.first()
+    
+    notification = Notification.query.filter_by(
+        user_id=target.user_id,
+        notification_type='upvote',
+        post_id=post_id,
+        group_post_id=group_post_id
+    ).first()
+    
+    if not latest:
+        if notification:
+            if not notification.is_read:
+                User.query.filter_by(id=target.user_id).update(
+                    {User.unread_notifications: User.unread_notifications - 1}, synchronize_session=False
+                )
+            db.session.delete(notification)
+            db.session.commit()
+            push_unread_counts([target.user_id])
+        return
+    
+    post_type = "group post" if group_post_id else "post"
+    others = upvoters.count() - 1
+    if others:
+        notification_text = f"{latest.username} and {others} other{'s' if others != 1 else ''} upvoted your {post_type}"
+    else:
+        notification_text = f"{latest.username} upvoted your {post_type}"
+    
+    if notification and notification.content == notification_text:
+        return
+    
+    # A retracted upvote only corrects the text, a new one brings the notification back up
+    if not upvoters.filter(Vote.user_id == voter_id).first():
+        if notification:
+            notification.sender_id = latest.id
+            notification.content = notification_text
+            db.session.commit()
+        return
+    
+    became_unread = not notification or notification.is_read
+    
+    if notification:
+        notification.sender_id = latest.id
+        notification.content = notification_text
+        notification.is_read = False
+        notification.created_at = get_est_time()
+    else:
+        db.session.add(Notification(
+            user_id=target.user_id,
+            sender_id=latest.id,
+            content=notification_text,
+            post_id=post_id,
+            group_post_id=group_post_id,
+            notification_type='upvote'
+        ))
+    
+    if became_unread:
+        User.query.filter_by(id=target.user_id).update(
+            {User.unread_notifications: User.unread_notifications + 1}, synchronize_session=False
+        )
+    db.session.commit()
+    
+    push_unread_counts([target.user_id])
 
 # Auth routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -181,6 +378,7 @@ def register():
         
         db.session.add(new_user)
         db.session.commit()
+        username_index.update(new_user.id, new_user.username, new_user.avatar_url)
         
         login_user(new_user)
         flash('Registration successful', 'success')
@@ -205,6 +403,7 @@ def delete_post(post_id):
         return redirect(url_for('feed'))
     
     Vote.query.filter_by(post_id=post_id).delete()
+    release_image(post.image_url)
     
     db.session.delete(post)
     db.session.commit()
@@ -221,11 +420,28 @@ def index():
 
 @app.route('/feed')
 def feed():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
+    posts, next_cursor = get_feed_page()
     
-    trending = Tag.query.order_by(Tag.count.desc()).limit(5).all()
+    trending = trending_tags.top(5)
 
-    return render_template('feed.html', posts=posts, trending_tags=trending)
+    return render_template('feed.html', posts=posts, next_cursor=next_cursor, trending_tags=trending)
+
+@app.route('/api/feed')
+def feed_page():
+    cursor = request.args.get('cursor')
+    
+    decoded = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    posts, next_cursor = get_feed_page(decoded)
+    
+    return jsonify({
+        'html': render_template('_feed_posts.html', posts=posts),
+        'next_cursor': next_cursor
+    })
 
 @app.route('/terms')
 def terms():
@@ -239,8 +455,6 @@ def privacy():
 def contact():
     return render_template('contact.html')
 
-trending_tags = Counter()
-
 @app.route('/create_post', methods=['POST'])
 @login_required
 def create_post():
@@ -271,18 +485,11 @@ def create_post():
     )
     
     db.session.add(new_post)
+    db.session.flush()
+    queue_mentions(content, post_id=new_post.id)
     db.session.commit()
     
-    hashtags = set(re.findall(r'#(\w+)', content))
-    for tag in hashtags:
-        existing = Tag.query.filter_by(name=tag).first()
-        if existing:
-            existing.count += 1
-        else:
-            db.session.add(Tag(name=tag))
-    db.session.commit()
-    
-    process_mentions(content, post=new_post)
+    trending_tags.record(extract_hashtags(content))
     
     flash('Post created successfully', 'success')
     return redirect(url_for('feed'))
@@ -290,57 +497,22 @@ def create_post():
 @app.route('/vote/<post_id>/<vote_type>', methods=['POST'])
 @login_required
 def vote(post_id, vote_type):
-    if vote_type not in ['upvote', 'downvote']:
+    if vote_type not in VOTE_TYPES:
         return jsonify({'error': 'Invalid vote type'}), 400
     
     post = Post.query.get_or_404(post_id)
     
-    existing_vote = Vote.query.filter_by(
-        post_id=post_id,
-        user_id=current_user.id
-    ).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == vote_type:
-            db.session.delete(existing_vote)
-            if vote_type == 'upvote':
-                post.upvotes = max(0, post.upvotes - 1)
-            else:
-                post.downvotes = max(0, post.downvotes - 1)
-        else:
-            existing_vote.vote_type = vote_type
-            if vote_type == 'upvote':
-                post.upvotes += 1
-                post.downvotes = max(0, post.downvotes - 1)
-            else:
-                post.downvotes += 1
-                post.upvotes = max(0, post.upvotes - 1)
-    else:
-        new_vote = Vote(
-            post_id=post_id,
-            user_id=current_user.id,
-            vote_type=vote_type
-        )
-        db.session.add(new_vote)
-        
-        if vote_type == 'upvote':
-            post.upvotes += 1
-        else:
-            post.downvotes += 1
-    
-    db.session.commit()
-    
-    process_mentions(post.content, post=post)
+    upvotes, downvotes, _ = cast_vote(current_user.id, vote_type, post_id=post_id)
     
     return jsonify({
-        'upvotes': post.upvotes,
-        'downvotes': post.downvotes
+        'upvotes': upvotes,
+        'downvotes': downvotes
     })
 
 @app.route('/group_vote/<post_id>/<vote_type>', methods=['POST'])
 @login_required
 def group_vote(post_id, vote_type):
-    if vote_type not in ['upvote', 'downvote']:
+    if vote_type not in VOTE_TYPES:
         return jsonify({'error': 'Invalid vote type'}), 400
     
     post = GroupPost.query.get_or_404(post_id)
@@ -349,52 +521,17 @@ def group_vote(post_id, vote_type):
     if not group.is_member(current_user):
         return jsonify({'error': 'You must be a member of the group to vote'}), 403
     
-    existing_vote = Vote.query.filter_by(
-        group_post_id=post_id,
-        user_id=current_user.id
-    ).first()
-    
-    if existing_vote:
-        if existing_vote.vote_type == vote_type:
-            db.session.delete(existing_vote)
-            if vote_type == 'upvote':
-                post.upvotes = max(0, post.upvotes - 1)
-            else:
-                post.downvotes = max(0, post.downvotes - 1)
-        else:
-            existing_vote.vote_type = vote_type
-            if vote_type == 'upvote':
-                post.upvotes += 1
-                post.downvotes = max(0, post.downvotes - 1)
-            else:
-                post.downvotes += 1
-                post.upvotes = max(0, post.upvotes - 1)
-    else:
-        new_vote = Vote(
-            group_post_id=post_id,
-            user_id=current_user.id,
-            vote_type=vote_type
-        )
-        db.session.add(new_vote)
-        
-        if vote_type == 'upvote':
-            post.upvotes += 1
-        else:
-            post.downvotes += 1
-    
-    db.session.commit()
-    
-    process_mentions(post.content, group_post=post)
+    upvotes, downvotes, _ = cast_vote(current_user.id, vote_type, group_post_id=post_id)
     
     return jsonify({
-        'upvotes': post.upvotes,
-        'downvotes': post.downvotes
+        'upvotes': upvotes,
+        'downvotes': downvotes
     })
 
 @app.route('/profile/<user_id>')
 def profile(user_id):
     user = User.query.get_or_404(user_id)
-    posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
+    posts = get_profile_posts(user_id)
     return render_template('profile.html', user=user, posts=posts)
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -415,11 +552,13 @@ def settings():
         if 'avatar' in request.files:
             avatar_file = request.files['avatar']
             if avatar_file and avatar_file.filename != '':
-                avatar_url = save_image(avatar_file)
+                avatar_url = save_image(avatar_file, kind='avatar')
                 if avatar_url:
+                    release_image(current_user.avatar_url)
                     current_user.avatar_url = avatar_url
         
         db.session.commit()
+        username_index.update(current_user.id, current_user.username, current_user.avatar_url)
         flash('Profile updated successfully', 'success')
         return redirect(url_for('settings'))
         
@@ -427,41 +566,22 @@ def settings():
 
 @app.route('/groups')
 def groups():
-    all_groups = Group.query.all()
-    user_groups = []
-    other_groups = []
+    search = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    # A mangled cursor just starts over from the first page
+    decoded = decode_groups_cursor(cursor) if cursor else None
     
-    if current_user.is_authenticated:
-        for group in all_groups:
-            if group.is_member(current_user):
-                user_groups.append({
-                    'id': group.id,
-                    'name': group.name,
-                    'icon': group.icon,
-                    'members_count': group.members_count,
-                    'description': group.description,
-                    'is_admin': group.is_admin(current_user)
-                })
-            else:
-                other_groups.append({
-                    'id': group.id,
-                    'name': group.name,
-                    'icon': group.icon,
-                    'members_count': group.members_count,
-                    'description': group.description,
-                    'is_admin': False
-                })
-    else:
-        other_groups = [{
-            'id': group.id,
-            'name': group.name,
-            'icon': group.icon,
-            'members_count': group.members_count,
-            'description': group.description,
-            'is_admin': False
-        } for group in all_groups]
+    user_id = current_user.id if current_user.is_authenticated else None
+    user_groups, other_groups, next_cursor = get_groups_page(user_id, search or None, decoded)
     
-    return render_template('groups.html', user_groups=user_groups, other_groups=other_groups)
+    return render_template(
+        'groups.html',
+        user_groups=user_groups,
+        other_groups=other_groups,
+        search=search,
+        first_page=decoded is None,
+        next_cursor=next_cursor
+    )
 
 @app.route('/create_group', methods=['POST'])
 @login_required
@@ -486,7 +606,8 @@ def create_group():
         name=name,
         description=description,
         icon=icon or 'people',
-        created_by=current_user.id
+        created_by=current_user.id,
+        member_count=1
     )
     
     db.session.add(new_group)
@@ -499,6 +620,7 @@ def create_group():
     )
     db.session.execute(stmt)
     db.session.commit()
+    invalidate_popular_groups()
     
     return jsonify({
         'success': True,
@@ -509,10 +631,7 @@ def create_group():
 def group_detail(group_id):
     group = Group.query.get_or_404(group_id)
     
-    members_data = db.session.query(User, group_members.c.is_admin) \
-        .join(group_members, User.id == group_members.c.user_id) \
-        .filter(group_members.c.group_id == group_id) \
-        .all()
+    members_data = get_group_members(group_id)
     
     members = [
         {
@@ -526,7 +645,7 @@ def group_detail(group_id):
     
     admins = [member for member in members if member['is_admin']]
     
-    posts = GroupPost.query.filter_by(group_id=group_id).order_by(GroupPost.created_at.desc()).all()
+    posts = get_group_posts(group_id)
     
     is_member = current_user.is_authenticated and group.is_member(current_user)
     is_admin = current_user.is_authenticated and group.is_admin(current_user)
@@ -556,7 +675,11 @@ def join_group(group_id):
         is_admin=False
     )
     db.session.execute(stmt)
+    Group.query.filter_by(id=group_id).update(
+        {Group.member_count: Group.member_count + 1}, synchronize_session=False
+    )
     db.session.commit()
+    invalidate_popular_groups()
     
     flash(f'You have joined {group.name}', 'success')
     return redirect(url_for('group_detail', group_id=group_id))
@@ -581,7 +704,11 @@ def leave_group(group_id):
     db.session.query(group_members) \
         .filter(group_members.c.user_id == current_user.id, group_members.c.group_id == group_id) \
         .delete(synchronize_session=False)
+    Group.query.filter_by(id=group_id).update(
+        {Group.member_count: Group.member_count - 1}, synchronize_session=False
+    )
     db.session.commit()
+    invalidate_popular_groups()
     
     flash(f'You have left {group.name}', 'success')
     return redirect(url_for('groups'))
@@ -623,17 +750,55 @@ def create_group_post(group_id):
     )
     
     db.session.add(new_post)
+    db.session.flush()
+    queue_mentions(content, group_post_id=new_post.id)
     db.session.commit()
     
-    process_mentions(content, group_post=new_post)
-    
     flash('Post created successfully', 'success')
     return redirect(url_for('group_detail', group_id=group_id))
 
+def tag_conversation_subject(conversation, message_content):
+    if not conversation.subject:
+        subject = classify_subject(message_content)
+        if subject != 'default':
+            conversation.subject = subject
+
+def queue_conversation_summary(conversation, user_message):
+    db.session.flush()
+    enqueue(
+        'conversation_summary',
+        key=f"conversation_summary:{user_message.id}",
+        conversation_id=conversation.id,
+        message_id=user_message.id
+    )
+
+@job('conversation_summary')
+def summarize_conversation(conversation_id, message_id):
+    """Fold old tutor messages into the conversation summary.
+
+    Runs as a background job after each student message, so the summary's
+    Gemini call never holds up the reply. The reply uses whatever summary
+    was there when the question came in.
+    """
+    conversation = db.session.get(AiConversation, conversation_id)
+    message = db.session.get(AiMessage, message_id)
+    if not conversation or not message:
+        return
+    
+    conversation_history = recent_history(conversation_id, exclude_id=message_id)
+    refresh_conversation_summary(conversation, conversation_history, message.content)
+
 @app.route('/ai-tutor')
 @login_required
 def ai_tutor():
-    conversation = AiConversation.query.filter_by(user_id=current_user.id).order_by(AiConversation.created_at.desc()).first()
+    conversation_id = request.args.get('conversation')
+    
+    if conversation_id:
+        conversation = AiConversation.query.get_or_404(conversation_id)
+        if conversation.user_id != current_user.id:
+            return render_template('404.html'), 404
+    else:
+        conversation = AiConversation.query.filter_by(user_id=current_user.id).order_by(AiConversation.created_at.desc()).first()
     
     if not conversation:
         conversation = AiConversation(user_id=current_user.id)
@@ -648,8 +813,68 @@ def ai_tutor():
         db.session.add(welcome_message)
         db.session.commit()
     
-    messages = conversation.messages
-    return render_template('ai_tutor.html', messages=messages, conversation=conversation)
+    messages, earlier_cursor = get_ai_messages_page(conversation.id)
+    conversations, _ = get_ai_conversations_page(current_user.id)
+    
+    return render_template(
+        'ai_tutor.html',
+        messages=messages,
+        conversation=conversation,
+        earlier_cursor=earlier_cursor,
+        conversations=conversations
+    )
+
+def serialize_ai_message(message):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'is_user': message.is_user,
+        'created_at': message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'time': message.created_at.strftime('%I:%M %p')
+    }
+
+@app.route('/ai-tutor/<conversation_id>/messages')
+@login_required
+def ai_tutor_messages(conversation_id):
+    conversation = AiConversation.query.get_or_404(conversation_id)
+    if conversation.user_id != current_user.id:
+        return jsonify({'error': 'Invalid conversation'}), 403
+    
+    cursor = request.args.get('cursor')
+    decoded = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    messages, next_cursor = get_ai_messages_page(conversation.id, decoded)
+    
+    return jsonify({
+        'messages': [serialize_ai_message(message) for message in messages],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/ai-tutor/conversations')
+@login_required
+def ai_tutor_conversations():
+    cursor = request.args.get('cursor')
+    decoded = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    conversations, next_cursor = get_ai_conversations_page(current_user.id, decoded)
+    
+    return jsonify({
+        'conversations': [{
+            'id': conversation.id,
+            'subject': conversation.subject,
+            'created_at': conversation.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'url': url_for('ai_tutor', conversation=conversation.id)
+        } for conversation in conversations],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/ai-tutor/send', methods=['POST'])
 @login_required
@@ -675,12 +900,15 @@ def ai_tutor_send():
         is_user=True
     )
     db.session.add(user_message)
+    tag_conversation_subject(conversation, message_content)
+    queue_mentions(message_content)
+    queue_conversation_summary(conversation, user_message)
     db.session.commit()
     
     try:
-        conversation_history = AiMessage.query.filter_by(conversation_id=conversation.id).order_by(AiMessage.created_at).limit(10).all()
+        conversation_history = recent_history(conversation.id, exclude_id=user_message.id)
         
-        ai_response = generate_ai_response(message_content, conversation_history)
+        ai_response = generate_ai_response(message_content, conversation_history, conversation.summary)
         
         ai_message = AiMessage(
             conversation_id=conversation.id,
@@ -690,8 +918,6 @@ def ai_tutor_send():
         db.session.add(ai_message)
         db.session.commit()
         
-        process_mentions(message_content)
-        
         return jsonify({
             'success': True,
             'user_message': {
@@ -716,8 +942,6 @@ def ai_tutor_send():
         db.session.add(ai_message)
         db.session.commit()
         
-        process_mentions(message_content)
-        
         return jsonify({
             'success': True,
             'user_message': {
@@ -733,6 +957,92 @@ def ai_tutor_send():
             'error': str(e)
         })
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/ai-tutor/stream', methods=['POST'])
+@login_required
+def ai_tutor_stream():
+    """Same as /ai-tutor/send, but relays the reply as Server-Sent Events.
+
+    Emits one 'user_message' event, a 'token' event per chunk from Gemini,
+    then 'done' once the full reply has been saved as an AiMessage. If the
+    client goes away mid-reply, the part already sent is saved instead.
+    """
+    message_content = request.form.get('message')
+    conversation_id = request.form.get('conversation_id')
+    
+    if not message_content:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+    
+    if conversation_id:
+        conversation = AiConversation.query.get(conversation_id)
+        if not conversation or conversation.user_id != current_user.id:
+            return jsonify({'error': 'Invalid conversation'}), 403
+    else:
+        conversation = AiConversation(user_id=current_user.id)
+        db.session.add(conversation)
+        db.session.commit()
+    
+    user_message = AiMessage(
+        conversation_id=conversation.id,
+        content=message_content,
+        is_user=True
+    )
+    db.session.add(user_message)
+    tag_conversation_subject(conversation, message_content)
+    queue_mentions(message_content)
+    queue_conversation_summary(conversation, user_message)
+    db.session.commit()
+    
+    conversation_history = recent_history(conversation.id, exclude_id=user_message.id)
+    summary = conversation.summary
+    
+    conversation_id = conversation.id
+    user_message_data = {
+        'id': user_message.id,
+        'content': user_message.content,
+        'created_at': user_message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    
+    def events():
+        yield sse_event('user_message', user_message_data)
+        
+        chunks = []
+        ai_message = None
+        reply = stream_ai_response(message_content, conversation_history, summary)
+        try:
+            for chunk in reply:
+                chunks.append(chunk)
+                yield sse_event('token', {'text': chunk})
+        finally:
+            # Runs on a client disconnect too, so the conversation keeps
+            # whatever part of the reply was already streamed
+            reply.close()
+            if chunks:
+                ai_message = AiMessage(
+                    conversation_id=conversation_id,
+                    content=''.join(chunks),
+                    is_user=False
+                )
+                db.session.add(ai_message)
+                db.session.commit()
+        
+        yield sse_event('done', {
+            'success': True,
+            'ai_message': {
+                'id': ai_message.id,
+                'content': ai_message.content,
+                'created_at': ai_message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
+        })
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/ai-tutor/clear', methods=['POST'])
 @login_required
 def clear_ai_conversation():
@@ -753,13 +1063,34 @@ def clear_ai_conversation():
 @app.route('/notifications')
 @login_required
 def notifications():
-    user_notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).all()
+    cursor = request.args.get('cursor')
+    decoded = decode_cursor(cursor) if cursor else None
+    
+    if decoded is None:
+        mark_notifications_read(current_user.id)
+    
+    user_notifications, next_cursor = get_notifications_page(current_user.id, decoded)
+    
+    return render_template('notifications.html', notifications=user_notifications, next_cursor=next_cursor)
 
-    for notification in user_notifications:
-        notification.is_read = True
-    db.session.commit()
+@app.route('/notifications/mark-read', methods=['POST'])
+@login_required
+def mark_read():
+    up_to = request.form.get('up_to')
+    
+    decoded = None
+    if up_to:
+        decoded = decode_cursor(up_to)
+        if decoded is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    marked = mark_notifications_read(current_user.id, decoded)
     
-    return render_template('notifications.html', notifications=user_notifications)
+    return jsonify({
+        'success': True,
+        'marked': marked,
+        'count': current_user.unread_notifications
+    })
 
 @app.route('/api/user-votes')
 @login_required
@@ -777,21 +1108,49 @@ def user_votes():
 
 @app.route('/api/search-users')
 def search_users():
-    query = request.args.get('q', '')
+    # Prefix completion from the in-memory index, no database query per keystroke
+    query = request.args.get('q', '').strip().lstrip('@')
     if not query or len(query) < 2:
         return jsonify([])
     
-    users = User.query.filter(
-        (User.username.ilike(f'%{query}%') | User.email.ilike(f'%{query}%'))
-    ).limit(10).all()
-    
-    results = [{
-        'id': user.id,
-        'username': user.username,
-        'avatar_url': user.avatar_url
-    } for user in users]
+    return jsonify(username_index.complete(query, limit=10))
+
+@app.route('/api/search')
+def search():
+    query = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'posts')
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    if search_type not in ('posts', 'group_posts', 'users'):
+        return jsonify({'error': 'Invalid search type'}), 400
+    
+    if search_type == 'users':
+        users, has_next = find_users(query, page)
+        results = [{
+            'id': user.id,
+            'username': user.username,
+            'avatar_url': user.avatar_url,
+            'url': url_for('profile', user_id=user.id)
+        } for user in users]
+    else:
+        group_posts = search_type == 'group_posts'
+        posts, has_next = find_posts(query, page, group_posts=group_posts)
+        results = [{
+            'id': post.id,
+            'content': post.content,
+            'image_url': post.image_url,
+            'username': post.user.username,
+            'avatar_url': post.user.avatar_url,
+            'upvotes': post.upvotes,
+            'created_at': post.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'url': url_for('group_detail', group_id=post.group_id) if group_posts else url_for('profile', user_id=post.user_id)
+        } for post in posts]
     
-    return jsonify(results)
+    return jsonify({
+        'results': results,
+        'page': page,
+        'has_next': has_next
+    })
 
 @app.route('/terms-offline.html')
 def terms_offline():
@@ -800,9 +1159,7 @@ def terms_offline():
 @app.route('/api/unread-notifications-count')
 @login_required
 def unread_notifications_count():
-    count = Notification.query.filter_by(user_id=current_user.id, is_read=False).count()
-    print(f"Unread notifications for user {current_user.username} (ID: {current_user.id}): {count}")
-    return jsonify({'count': count})
+    return jsonify({'count': current_user.unread_notifications})
 
 
 # Error handlers
@@ -0,0 +1,144 @@
+import re
+import click
+from sqlalchemy import column, text
+from sqlalchemy.orm import joinedload
+from app import app, db, User, Post, GroupPost
+
+SEARCH_PAGE_SIZE = 20
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# FTS5 tables mirror these columns through SQLite triggers. They are external
+# content tables keyed on the source table's rowid, so the text isn't stored twice.
+SEARCH_INDEXES = {
+    'user_fts': ('user', ('username', 'email')),
+    'post_fts': ('post', ('content',)),
+    'group_post_fts': ('group_post', ('content',)),
+}
+
+def fts_available():
+    return db.engine.dialect.name == 'sqlite'
+
+def create_search_index():
+    """Create the FTS5 tables and their sync triggers if they're missing.
+
+    A newly created table is filled from its source table. Returns the
+    names of the tables that were created.
+    """
+    if not fts_available():
+        return []
+
+    existing = {name for (name,) in db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_fts'")
+    )}
+    created = []
+    for fts, (table, columns) in SEARCH_INDEXES.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='rowid', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        db.session.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        db.session.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); END"
+        ))
+        db.session.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON "{table}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        ))
+        if fts not in existing:
+            created.append(fts)
+    db.session.commit()
+
+    for fts in created:
+        rebuild_search_index(fts)
+    return created
+
+def rebuild_search_index(*tables):
+    """Re-read every row of the source tables into their FTS5 tables.
+
+    Needed after a VACUUM, which may renumber the rowids the index points at.
+    """
+    for fts in tables or SEARCH_INDEXES:
+        db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    db.session.commit()
+
+def match_expression(query, prefix=True):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Only word characters survive, so user input can't inject FTS5 syntax.
+    Returns None when there's nothing to search for.
+    """
+    tokens = TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+def _ranked_ids(fts, model, match, page, limit, extra_order=''):
+    # Typed as the model's id so compact (blob) keys come back as strings
+    rows = db.session.execute(text(
+        f'SELECT t.id FROM {fts} JOIN "{model.__tablename__}" t ON t.rowid = {fts}.rowid '
+        f"WHERE {fts} MATCH :match ORDER BY {fts}.rank{extra_order} LIMIT :limit OFFSET :offset"
+    ).columns(column('id', model.id.type)), {'match': match, 'limit': limit + 1, 'offset': (page - 1) * limit})
+    ids = [row_id for (row_id,) in rows]
+    return ids[:limit], len(ids) > limit
+
+def _in_order(query, model, ids):
+    by_id = {item.id: item for item in query.filter(model.id.in_(ids))}
+    return [by_id[item_id] for item_id in ids if item_id in by_id]
+
+def find_users(query, page=1, limit=SEARCH_PAGE_SIZE):
+    """Users whose username or email matches query, best first. Returns (users, has_next)."""
+    if not fts_available():
+        users = User.query.filter(
+            User.username.ilike(f'%{query}%') | User.email.ilike(f'%{query}%')
+        ).order_by(User.username).offset((page - 1) * limit).limit(limit + 1).all()
+        return users[:limit], len(users) > limit
+
+    match = match_expression(query)
+    if not match:
+        return [], False
+    # Shorter usernames first among equal scores, so "ann" ranks above "annabelle"
+    ids, has_next = _ranked_ids('user_fts', User, match, page, limit, ', length(t.username)')
+    return _in_order(User.query, User, ids), has_next
+
+def find_posts(query, page=1, limit=SEARCH_PAGE_SIZE, group_posts=False):
+    """Posts (or group posts) matching query, ranked by bm25. Returns (posts, has_next)."""
+    model = GroupPost if group_posts else Post
+    posts_query = model.query.options(joinedload(model.user))
+
+    if not fts_available():
+        posts = posts_query.filter(model.content.ilike(f'%{query}%')) \
+            .order_by(model.created_at.desc(), model.id.desc()) \
+            .offset((page - 1) * limit).limit(limit + 1).all()
+        return posts[:limit], len(posts) > limit
+
+    match = match_expression(query)
+    if not match:
+        return [], False
+    ids, has_next = _ranked_ids(
+        'group_post_fts' if group_posts else 'post_fts',
+        model,
+        match, page, limit
+    )
+    return _in_order(posts_query, model, ids), has_next
+
+@app.cli.command('rebuild-search')
+def rebuild_search():
+    """Rebuild the full-text search index, e.g. after a VACUUM."""
+    if not fts_available():
+        click.echo('Full-text search needs SQLite, nothing to rebuild')
+        return
+    rebuild_search_index()
+    click.echo('Search index rebuilt')
@@ -16,43 +16,54 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 5000);
     });
     
-    function checkUnreadNotifications() {
-        const notificationsLink = document.querySelector('a[href*="notifications"]');
-        if (!notificationsLink) {
-            console.error('Notifications link not found in the DOM');
-            return;
-        }
+    const notificationsLink = document.querySelector('a[href*="notifications"]');
+    
+    function renderUnreadCount(count) {
+        const existingBadge = notificationsLink.querySelector('.notification-badge');
         
-        console.log('Checking for unread notifications...');
+        if (count > 0) {
+            if (existingBadge) {
+                existingBadge.textContent = count;
+            } else {
+                const badge = document.createElement('span');
+                badge.className = 'badge bg-danger notification-badge';
+                badge.textContent = count;
+                notificationsLink.appendChild(badge);
+            }
+        } else if (existingBadge) {
+            existingBadge.remove();
+        }
+    }
+    
+    function checkUnreadNotifications() {
         fetch('/api/unread-notifications-count')
             .then(response => response.json())
-            .then(data => {
-                const count = data.count;
-                console.log('Unread notifications:', count);
-                const existingBadge = notificationsLink.querySelector('.notification-badge');
-                
-                if (count > 0) {
-                    if (existingBadge) {
-                        console.log('Updating existing badge:', count);
-                        existingBadge.textContent = count;
-                    } else {
-                        console.log('Creating new badge:', count);
-                        const badge = document.createElement('span');
-                        badge.className = 'badge bg-danger notification-badge';
-                        badge.textContent = count;
-                        notificationsLink.appendChild(badge);
-                    }
-                } else if (existingBadge) {
-                    console.log('Removing badge - no unread notifications');
-                    existingBadge.remove();
-                }
-            })
+            .then(data => renderUnreadCount(data.count))
             .catch(error => console.error('Error fetching notification count:', error));
     }
     
-    if (document.querySelector('a[href*="notifications"]')) {
-        checkUnreadNotifications();
-        setInterval(checkUnreadNotifications, 30000);
+    if (notificationsLink) {
+        // The server pushes the count over Socket.IO whenever it changes; the
+        // badge is already rendered on page load, so we only poll while the
+        // socket is down and resync after a reconnect.
+        const socket = typeof io !== 'undefined' ? io() : null;
+        
+        if (socket) {
+            let connectedBefore = false;
+            socket.on('connect', function() {
+                if (connectedBefore) {
+                    checkUnreadNotifications();
+                }
+                connectedBefore = true;
+            });
+            socket.on('unread_count', data => renderUnreadCount(data.count));
+        }
+        
+        setInterval(function() {
+            if (!socket || !socket.connected) {
+                checkUnreadNotifications();
+            }
+        }, 30000);
     }
     
     function checkVoteStatus() {
@@ -0,0 +1,174 @@
+import hashlib
+import hmac
+import os
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+def content_type(name):
+    return CONTENT_TYPES.get(name.rsplit('.', 1)[-1].lower(), 'application/octet-stream')
+
+class StorageError(Exception):
+    pass
+
+class LocalStorage:
+    """Files in a directory on this machine, the default for a single node."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if os.path.dirname(path) != os.path.abspath(self.root):
+            raise FileNotFoundError(name)
+        return path
+
+    def save(self, name, data, content_type=None):
+        # Write then rename, so a half-written file is never served. The temp
+        # file is unique per call, as threads may save the same name at once
+        path = self.path(name)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp creates it owner-only
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def open(self, name):
+        """Return a binary file object for name, or raise FileNotFoundError."""
+        return open(self.path(name), 'rb')
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+class S3Storage:
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+
+    Talks to the REST API directly over a pooled requests.Session, signing
+    each call with AWS Signature Version 4, and uses path-style URLs so a
+    local MinIO (or any stand-in) at endpoint_url works the same as AWS.
+    Every app node pointed at the same bucket sees the same media.
+    """
+
+    def __init__(self, bucket, access_key, secret_key, endpoint_url=None,
+                 region='us-east-1', prefix='', timeout=(3.05, 30), pool_size=10):
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.endpoint_url = (endpoint_url or f"https://s3.{region}.amazonaws.com").rstrip('/')
+        self.region = region
+        self.prefix = prefix
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, name):
+        return f"{self.endpoint_url}/{self.bucket}/{quote(self.prefix + name, safe='/~')}"
+
+    def sign(self, method, url, headers, payload_hash, now=None):
+        """Add SigV4 x-amz-date, x-amz-content-sha256 and Authorization headers."""
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        parts = urlsplit(url)
+
+        headers = dict(headers, **{
+            'host': parts.netloc,
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+        })
+        signed = {key.lower(): str(value).strip() for key, value in headers.items()}
+        signed_headers = ';'.join(sorted(signed))
+        canonical_request = '\n'.join([
+            method,
+            parts.path or '/',
+            parts.query,
+            ''.join(f"{key}:{signed[key]}\n" for key in sorted(signed)),
+            signed_headers,
+            payload_hash,
+        ])
+
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        key = ('AWS4' + self.secret_key).encode()
+        for part in (date, self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers['Authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        del headers['host']  # requests sets it from the URL
+        return headers
+
+    def request(self, method, name, data=b'', headers=None, stream=False):
+        url = self.url(name)
+        headers = self.sign(method, url, headers or {}, hashlib.sha256(data).hexdigest())
+        try:
+            response = self.session.request(method, url, data=data or None, headers=headers,
+                                            timeout=self.timeout, stream=stream)
+        except requests.RequestException as e:
+            raise StorageError(f"S3 {method} {name} failed: {e}")
+
+        if response.status_code == 404:
+            response.close()
+            raise FileNotFoundError(name)
+        if response.status_code >= 300:
+            response.close()
+            raise StorageError(f"S3 {method} {name} failed: {response.status_code} - {response.text[:500]}")
+        return response
+
+    def save(self, name, data, content_type=None):
+        headers = {'content-type': content_type} if content_type else {}
+        self.request('PUT', name, data, headers).close()
+
+    def open(self, name):
+        """Return a file object streaming the object's body, or raise FileNotFoundError."""
+        response = self.request('GET', name, stream=True)
+        response.raw.decode_content = True
+        return response.raw
+
+    def exists(self, name):
+        try:
+            self.request('HEAD', name).close()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete(self, name):
+        try:
+            self.request('DELETE', name).close()
+        except FileNotFoundError:
+            pass
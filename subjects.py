@@ -0,0 +1,92 @@
+import math
+import re
+
+SUBJECT_KEYWORDS = {
+    "math": [
+        "math", "maths", "mathematics", "algebra", "geometry", "calculus", "trigonometry",
+        "equation", "equations", "solve", "integral", "derivative", "function", "graph",
+        "fraction", "fractions", "percent", "percentage", "probability", "statistics",
+        "matrix", "vector", "polynomial", "quadratic", "linear", "angle", "triangle",
+        "circle", "area", "volume", "perimeter", "sum", "product", "multiply", "divide",
+        "logarithm", "exponent", "theorem", "proof", "prime", "number", "numbers",
+        "sin", "cos", "tan", "limit", "slope", "mean", "median", "factor",
+    ],
+    "science": [
+        "science", "biology", "chemistry", "physics", "cell", "cells", "atom", "atoms",
+        "molecule", "molecules", "element", "compound", "reaction", "energy", "force",
+        "gravity", "velocity", "acceleration", "mass", "electron", "proton", "neutron",
+        "photosynthesis", "evolution", "dna", "gene", "genes", "organism", "ecosystem",
+        "experiment", "hypothesis", "electricity", "magnet", "light", "wave", "waves",
+        "heat", "temperature", "acid", "base", "ph", "planet", "solar", "climate",
+        "species", "bacteria", "virus", "enzyme", "protein", "newton", "momentum",
+    ],
+    "english": [
+        "english", "literature", "essay", "poem", "poetry", "novel", "story", "author",
+        "character", "characters", "theme", "themes", "metaphor", "simile", "grammar",
+        "sentence", "paragraph", "thesis", "shakespeare", "hamlet", "macbeth", "plot",
+        "symbolism", "irony", "tone", "narrator", "verb", "noun", "adjective", "adverb",
+        "punctuation", "comma", "write", "writing", "read", "reading", "quote",
+        "analysis", "rhetoric", "persuasive", "argument", "vocabulary", "spelling",
+    ],
+    "history": [
+        "history", "historical", "war", "wars", "revolution", "empire", "king", "queen",
+        "century", "ancient", "medieval", "civilization", "battle", "treaty", "colony",
+        "colonial", "independence", "president", "government", "democracy", "constitution",
+        "dynasty", "rome", "roman", "greek", "egypt", "napoleon", "hitler", "wwi", "wwii",
+        "slavery", "renaissance", "reformation", "industrial", "confederation",
+        "parliament", "election", "monarchy", "feudal", "crusades", "holocaust",
+    ],
+}
+
+TOKEN_RE = re.compile(r"[a-z]+")
+MATH_EXPRESSION_RE = re.compile(r"\d\s*[-+*/^=]\s*\d|[=^√∫π]|\b\d+x\b|\bx\s*=")
+
+class SubjectClassifier:
+    """Keyword classifier for tutor questions, weighted TF-IDF style.
+
+    Each keyword weighs log(1 + subjects / subjects_using_it), so words
+    shared between subjects count for less than ones that only belong to
+    one. Anything that looks like arithmetic or an equation adds to math.
+    Pure Python and well under a millisecond per question.
+    """
+
+    def __init__(self, keywords=SUBJECT_KEYWORDS, min_score=0.5):
+        self.min_score = min_score
+        document_frequency = {}
+        for words in keywords.values():
+            for word in set(words):
+                document_frequency[word] = document_frequency.get(word, 0) + 1
+
+        self.vocabulary = set(document_frequency)
+        subjects = len(keywords)
+        self.weights = {
+            subject: {word: math.log(1 + subjects / document_frequency[word]) for word in words}
+            for subject, words in keywords.items()
+        }
+
+    def scores(self, text):
+        text = (text or "").lower()
+        tokens = TOKEN_RE.findall(text)
+        # Fold simple plurals so "equations" and "equation" both match
+        tokens += [token[:-1] for token in tokens
+                   if len(token) > 3 and token.endswith("s") and token not in self.vocabulary]
+
+        scores = {subject: 0.0 for subject in self.weights}
+        for subject, weights in self.weights.items():
+            for token in tokens:
+                scores[subject] += weights.get(token, 0.0)
+
+        if "math" in scores:
+            scores["math"] += 1.5 * len(MATH_EXPRESSION_RE.findall(text))
+        return scores
+
+    def classify(self, text):
+        """Return the best matching subject, or "default" when nothing stands out."""
+        scores = self.scores(text)
+        subject, score = max(scores.items(), key=lambda item: item[1])
+        return subject if score >= self.min_score else "default"
+
+classifier = SubjectClassifier()
+
+def classify_subject(text):
+    return classifier.classify(text)
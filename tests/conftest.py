@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+# app.py sets itself up on import: point it at a throwaway database and
+# keep its module-level app.run() from starting a server.
+# Requests reuse an app context that is already pushed, session included, so
+# tests only open one (with app.app_context()) around their own database work.
+_directory = tempfile.mkdtemp(prefix='marinet-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_directory, 'marinet.db')}"
+os.environ['FLASK_RUN_FROM_CLI'] = 'true'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, User
+from jobs import worker
+
+app.config['TESTING'] = True
+app.config['JOB_WORKER_THREADS'] = 0  # tests run jobs themselves, see run_jobs
+app.config['TRENDING_THREAD'] = False  # tests flush and rebuild trending_tags themselves
+app.config['UPLOAD_FOLDER'] = os.path.join(_directory, 'uploads')
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.fixture
+def make_user():
+    """Create a user with a unique name and return its id."""
+    def make(username=None):
+        with app.app_context():
+            user = User(
+                username=username or f'user_{uuid.uuid4().hex[:10]}',
+                email=f'{uuid.uuid4().hex}@school.edu',
+                password=generate_password_hash('password')
+            )
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+@pytest.fixture
+def login():
+    """Sign client in as user_id without going through the login form."""
+    def sign_in(client, user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = user_id
+            session['_fresh'] = True
+        return client
+    return sign_in
+
+@pytest.fixture
+def run_jobs():
+    """Run queued jobs until none are due. Returns how many ran."""
+    def run():
+        ran = 0
+        with app.app_context():
+            while True:
+                count = worker.run_pending()
+                if not count:
+                    return ran
+                ran += count
+    return run
+
+@contextmanager
+def count_queries(only=None):
+    """Collect (statement, parameters) for every SQL statement run inside the block.
+
+    only, e.g. ('SELECT', 'UPDATE'), keeps just statements of those kinds.
+
+    Usage:
+        with count_queries() as statements:
+            client.get('/feed')
+        assert len(statements) == 1
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not only or statement.lstrip().upper().startswith(tuple(only)):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+@pytest.fixture(name='count_queries')
+def count_queries_fixture():
+    return count_queries
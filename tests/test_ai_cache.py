@@ -0,0 +1,30 @@
+from ai_cache import ResponseCache
+
+def ask(question, *history):
+    contents = [{'role': role, 'parts': [{'text': text}]} for role, text in history]
+    return contents + [{'role': 'user', 'parts': [{'text': question}]}]
+
+def test_same_opening_question_hits_despite_formatting():
+    cache = ResponseCache()
+    cache.set(ask('What is a prime number?'), 'A number with exactly two divisors.')
+
+    assert cache.get(ask('  what is a PRIME number ')) == 'A number with exactly two divisors.'
+    assert cache.metrics()['hits'] == 1
+
+def test_question_after_different_history_is_a_miss():
+    cache = ResponseCache()
+    cache.set(ask('Why?', ('user', 'Is 1 prime?'), ('model', 'No.')), 'It has only one divisor.')
+
+    assert cache.get(ask('Why?', ('user', 'Is 2 prime?'), ('model', 'Yes.'))) is None
+    assert cache.metrics()['misses'] == 1
+
+def test_metrics_are_reported_every_n_lookups(capsys):
+    cache = ResponseCache(report_every=2)
+    cache.set(ask('hello'), 'Hi!')
+
+    cache.get(ask('hello'))
+    assert capsys.readouterr().out == ''
+    cache.get(ask('goodbye'))
+    report = capsys.readouterr().out
+    assert report.startswith('AI response cache: ')
+    assert "'hits': 1" in report and "'misses': 1" in report and "'hit_rate': 0.5" in report
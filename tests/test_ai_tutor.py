@@ -0,0 +1,41 @@
+import routes
+from app import app, AiConversation, AiMessage
+
+def tutor_messages(user_id):
+    with app.app_context():
+        conversation = AiConversation.query.filter_by(user_id=user_id).one()
+        return [(m.is_user, m.content) for m in
+                AiMessage.query.filter_by(conversation_id=conversation.id).order_by(AiMessage.created_at)]
+
+def fake_reply(*chunks):
+    def stream_ai_response(user_message, conversation_history=None, summary=None):
+        yield from chunks
+    return stream_ai_response
+
+def test_summary_is_refreshed_by_a_job_not_the_request(client, make_user, login, run_jobs, monkeypatch):
+    user_id = make_user()
+    login(client, user_id)
+    refreshed = []
+    monkeypatch.setattr(routes, 'stream_ai_response', fake_reply('Photosynthesis ', 'makes sugar.'))
+    monkeypatch.setattr(routes, 'refresh_conversation_summary',
+                        lambda conversation, history, message: refreshed.append(message))
+
+    response = client.post('/ai-tutor/stream', data={'message': 'What is photosynthesis?'})
+
+    assert b'event: done' in response.data
+    assert refreshed == []
+    run_jobs()
+    assert refreshed == ['What is photosynthesis?']
+
+def test_partial_reply_is_saved_when_client_disconnects(client, make_user, login, run_jobs, monkeypatch):
+    user_id = make_user()
+    login(client, user_id)
+    monkeypatch.setattr(routes, 'stream_ai_response', fake_reply('Mitosis ', 'has four ', 'phases.'))
+
+    response = client.post('/ai-tutor/stream', data={'message': 'Explain mitosis'}, buffered=False)
+    events = iter(response.response)
+    assert b'user_message' in next(events)
+    assert b'Mitosis' in next(events)
+    response.close()  # the browser tab was closed
+
+    assert tutor_messages(user_id) == [(True, 'Explain mitosis'), (False, 'Mitosis ')]
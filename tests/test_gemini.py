@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from gemini import CircuitBreaker, GeminiClient, GeminiError, GeminiRejected, GeminiUnavailable
+
+def reply(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+
+class StubGemini:
+    """A local stand-in for the Gemini API that plays back scripted responses.
+
+    Each script entry is (status, body) for generateContent, or
+    ('stream', [chunk texts]) for an SSE streamGenerateContent reply, or
+    ('redirect', None) to send the client round in circles. Once the script
+    runs out every request gets a 200.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                status, body = stub.script.pop(0) if stub.script else (200, reply('ok'))
+                if status == 'redirect':
+                    self.send_response(307)
+                    self.send_header('Location', self.path)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                elif status == 'stream':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.end_headers()
+                    for text in body:
+                        self.wfile.write(f'data: {json.dumps(reply(text))}\n\n'.encode())
+                        self.wfile.flush()
+                    self.close_connection = True
+                else:
+                    data = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v1beta'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub():
+    server = StubGemini()
+    yield server
+    server.close()
+
+def make_client(stub, failure_threshold=2, reset_timeout=0.2):
+    return GeminiClient(
+        api_key='test', base_url=stub.url, model='stub', timeout=(1, 2),
+        max_retries=2, backoff=0, queue_timeout=0.1,
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+    )
+
+def open_breaker(client, stub):
+    stub.script = [(503, {})] * 3 * client.breaker.failure_threshold
+    for _ in range(client.breaker.failure_threshold):
+        with pytest.raises(GeminiError):
+            client.generate([])
+    assert client.breaker.is_open
+
+def test_transient_errors_are_retried(stub):
+    client = make_client(stub)
+    stub.script = [(503, {}), (429, {}), (200, reply('hello'))]
+
+    assert client.generate([]) == 'hello'
+    assert stub.requests == 3
+    assert not client.breaker.is_open
+
+def test_rejected_request_is_not_retried_and_keeps_breaker_closed(stub):
+    client = make_client(stub, failure_threshold=1)
+    stub.script = [(400, {'error': 'bad request'})]
+
+    with pytest.raises(GeminiRejected):
+        client.generate([])
+    assert stub.requests == 1
+    assert not client.breaker.is_open
+
+def test_breaker_fails_fast_then_lets_one_trial_through(stub):
+    client = make_client(stub)
+    open_breaker(client, stub)
+    seen = stub.requests
+
+    with pytest.raises(GeminiUnavailable):
+        client.generate([])
+    assert stub.requests == seen  # refused without calling upstream
+
+    time.sleep(0.25)
+    stub.script = [(200, reply('back'))]
+    assert client.generate([]) == 'back'
+    assert not client.breaker.is_open
+
+def test_failed_trial_reopens_breaker(stub):
+    client = make_client(stub)
+    open_breaker(client, stub)
+
+    time.sleep(0.25)
+    stub.script = [(503, {})] * 3
+    with pytest.raises(GeminiError):
+        client.generate([])
+    assert client.breaker.is_open
+    with pytest.raises(GeminiUnavailable):
+        client.generate([])
+
+def test_streams_closed_by_reader_do_not_open_breaker(stub):
+    client = make_client(stub)
+
+    for _ in range(client.breaker.failure_threshold + 3):
+        stub.script = [('stream', ['first ', 'second ', 'third'])]
+        chunks = client.stream_generate([])
+        assert next(chunks) == 'first '
+        chunks.close()  # the browser went away mid-answer
+
+    assert not client.breaker.is_open
+    assert client.generate([]) == 'ok'
+
+def test_trial_stream_closed_by_reader_does_not_wedge_breaker(stub):
+    client = make_client(stub)
+    open_breaker(client, stub)
+
+    time.sleep(0.25)
+    stub.script = [('stream', ['first ', 'second ', 'third'])]
+    chunks = client.stream_generate([])
+    assert next(chunks) == 'first '
+    chunks.close()
+
+    # Neither a success nor a failure: still open, and the next call is the trial
+    assert client.breaker.is_open
+    stub.script = [('stream', ['recovered'])]
+    assert list(client.stream_generate([])) == ['recovered']
+    assert not client.breaker.is_open
+
+def test_trial_ending_in_unexpected_request_error_does_not_wedge_breaker(stub):
+    client = make_client(stub)
+    open_breaker(client, stub)
+
+    time.sleep(0.25)
+    stub.script = [('redirect', None)] * 50  # requests gives up with TooManyRedirects
+    with pytest.raises(GeminiError):
+        client.generate([])
+
+    assert client.breaker.is_open
+    time.sleep(0.25)
+    stub.script = [(200, reply('fine'))]
+    assert client.generate([]) == 'fine'
+
+def test_concurrency_slots_are_released(stub):
+    client = make_client(stub)
+    client._slots = threading.BoundedSemaphore(1)
+
+    stub.script = [('stream', ['a', 'b'])]
+    chunks = client.stream_generate([])
+    next(chunks)
+    with pytest.raises(GeminiUnavailable):
+        client.generate([])  # the open stream holds the only slot
+    chunks.close()
+
+    assert client.generate([]) == 'ok'
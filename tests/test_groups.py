@@ -0,0 +1,56 @@
+import uuid
+from app import app, db, Group, group_members
+from queries import decode_groups_cursor, get_groups_page
+
+def make_groups(creator_id, prefix, member_counts):
+    with app.app_context():
+        groups = [Group(name=f'{prefix} {i}', created_by=creator_id, member_count=count)
+                  for i, count in enumerate(member_counts)]
+        db.session.add_all(groups)
+        db.session.commit()
+        return [group.id for group in groups]
+
+def join(user_id, group_id, is_admin=False):
+    with app.app_context():
+        db.session.execute(group_members.insert().values(user_id=user_id, group_id=group_id, is_admin=is_admin))
+        db.session.commit()
+
+def test_groups_page_lists_own_groups_then_pages_the_rest_biggest_first(make_user):
+    viewer_id = make_user()
+    prefix = f'club-{uuid.uuid4().hex[:8]}'
+    ids = make_groups(make_user(), prefix, [5, 40, 12, 12, 3, 25, 8])
+    join(viewer_id, ids[1], is_admin=True)
+    join(viewer_id, ids[4])
+
+    with app.app_context():
+        mine, others, cursor = get_groups_page(viewer_id, prefix, per_page=2)
+        assert [(g['id'], g['is_admin']) for g in mine] == [(ids[1], True), (ids[4], False)]
+        assert all(g['is_member'] for g in mine)
+
+        seen = [g['id'] for g in others]
+        while cursor:
+            mine, others, cursor = get_groups_page(viewer_id, prefix, decode_groups_cursor(cursor), per_page=2)
+            assert mine == []
+            seen += [g['id'] for g in others]
+
+        # Biggest first, ties by id, each group exactly once
+        tied = sorted([ids[2], ids[3]], reverse=True)
+        assert seen == [ids[5], *tied, ids[6], ids[0]]
+        assert not any(g['is_member'] for g in others)
+
+def test_groups_route_follows_cursor(client, make_user, login):
+    viewer = login(client, make_user())
+    prefix = f'club-{uuid.uuid4().hex[:8]}'
+    make_groups(make_user(), prefix, range(30))
+
+    first = viewer.get(f'/groups?q={prefix}')
+    assert first.status_code == 200
+    assert f'{prefix} 29'.encode() in first.data and f'{prefix} 0<'.encode() not in first.data
+    assert b'cursor=' in first.data
+
+    with app.app_context():
+        _, _, cursor = get_groups_page(None, prefix)
+    second = viewer.get(f'/groups?q={prefix}&cursor={cursor}')
+    assert second.status_code == 200
+    assert f'{prefix} 0<'.encode() in second.data and b'First page' in second.data
+    assert viewer.get('/groups?cursor=not-a-cursor').status_code == 200
@@ -0,0 +1,48 @@
+from app import app, db, Post, Notification, User
+
+def make_post(author_id):
+    with app.app_context():
+        post = Post(content='upvote me', user_id=author_id)
+        db.session.add(post)
+        db.session.commit()
+        return post.id
+
+def upvote_notification(author_id, post_id):
+    with app.app_context():
+        notification = Notification.query.filter_by(
+            user_id=author_id, post_id=post_id, notification_type='upvote'
+        ).first()
+        unread = db.session.get(User, author_id).unread_notifications
+        return (notification.content if notification else None), unread
+
+def test_retracted_upvote_drops_out_of_notification(client, make_user, login, run_jobs):
+    author_id = make_user()
+    bob = login(app.test_client(), make_user('bob_notify'))
+    carol = login(app.test_client(), make_user('carol_notify'))
+    post_id = make_post(author_id)
+
+    bob.post(f'/vote/{post_id}/upvote')
+    carol.post(f'/vote/{post_id}/upvote')
+    run_jobs()
+    assert upvote_notification(author_id, post_id) == ('carol_notify and 1 other upvoted your post', 1)
+
+    carol.post(f'/vote/{post_id}/upvote')  # same vote again retracts it
+    run_jobs()
+    assert upvote_notification(author_id, post_id) == ('bob_notify upvoted your post', 1)
+
+    bob.post(f'/vote/{post_id}/upvote')
+    run_jobs()
+    assert upvote_notification(author_id, post_id) == (None, 0)
+
+def test_retraction_before_jobs_run_names_remaining_voter(client, make_user, login, run_jobs):
+    author_id = make_user()
+    bob = login(app.test_client(), make_user('bob_late'))
+    carol = login(app.test_client(), make_user('carol_late'))
+    post_id = make_post(author_id)
+
+    bob.post(f'/vote/{post_id}/upvote')
+    carol.post(f'/vote/{post_id}/upvote')
+    carol.post(f'/vote/{post_id}/upvote')
+    run_jobs()
+
+    assert upvote_notification(author_id, post_id) == ('bob_late upvoted your post', 1)
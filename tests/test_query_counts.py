@@ -0,0 +1,57 @@
+import pytest
+from app import app, db, Post, Group, GroupPost, group_members
+
+# Pages must run the same number of statements however many posts they show:
+# authors come in with the posts (joinedload), never one lazy load per post.
+POSTS = 30
+
+def add_posts(author_id, count, group_id=None):
+    with app.app_context():
+        for i in range(count):
+            db.session.add(Post(content=f'post {i}', user_id=author_id))
+            if group_id:
+                db.session.add(GroupPost(content=f'group post {i}', user_id=author_id, group_id=group_id))
+        db.session.commit()
+
+def make_group(admin_id):
+    with app.app_context():
+        group = Group(name='Chess Club', created_by=admin_id, member_count=1)
+        db.session.add(group)
+        db.session.flush()
+        db.session.execute(group_members.insert().values(user_id=admin_id, group_id=group.id, is_admin=True))
+        db.session.commit()
+        return group.id
+
+@pytest.fixture
+def viewer(client, make_user, login):
+    login(client, make_user())
+    # Fill the popular groups sidebar cache so it doesn't count against the first page
+    client.get('/feed')
+    return client
+
+def statement_count(client, count_queries, url):
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), '\n'.join(statement for statement, _ in statements)
+
+@pytest.mark.parametrize('page, expected', [
+    ('feed', 2),  # posts with authors, current user
+    ('profile', 3),  # profile user, posts with authors, current user
+    ('group', 6),  # group, current user, posts with authors, members, is_member, is_admin
+])
+def test_page_query_count_does_not_grow_with_posts(viewer, make_user, count_queries, page, expected):
+    author_id = make_user()
+    group_id = make_group(author_id)
+    url = {
+        'feed': '/feed',
+        'profile': f'/profile/{author_id}',
+        'group': f'/groups/{group_id}',
+    }[page]
+
+    empty, statements = statement_count(viewer, count_queries, url)
+    assert empty == expected, statements
+
+    add_posts(author_id, POSTS, group_id)
+    full, statements = statement_count(viewer, count_queries, url)
+    assert full == expected, statements
@@ -0,0 +1,68 @@
+from datetime import datetime
+import pytest
+from app import app, db, recent_history, AiConversation, Group, Notification, Vote, group_members
+from queries import (get_feed_page, get_profile_posts, get_group_posts, get_group_members, get_groups_page,
+                     get_notifications_page, get_ai_messages_page, get_ai_conversations_page)
+from routes import mark_notifications_read
+
+def full_scans(statement, parameters=()):
+    """Return the EXPLAIN QUERY PLAN lines that read a whole table.
+
+    Walking an index in ORDER BY order is only a scan the LIMIT cuts short
+    (the first feed page), so it passes when the statement has one.
+    """
+    connection = db.session.connection().connection
+    plan = connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    limited = ' LIMIT ' in statement.upper()
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        if not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail:
+            continue
+        if ' USING ' in detail and limited:
+            continue
+        scans.append(detail)
+    return scans
+
+def hot_queries(user_id, group_id, conversation_id):
+    """Run the queries behind the busiest routes."""
+    cursor = (datetime(2100, 1, 1), 'ffffffff-ffff-ffff-ffff-ffffffffffff')
+
+    get_feed_page()
+    get_feed_page(cursor)
+    get_profile_posts(user_id)
+    get_group_posts(group_id)
+    get_group_members(group_id)
+    get_groups_page(user_id)
+    get_groups_page(user_id, 'x', (2, 'ffffffff-ffff-ffff-ffff-ffffffffffff'))
+    get_groups_page(None)
+    get_notifications_page(user_id, cursor)
+    mark_notifications_read(user_id, cursor)
+    get_ai_messages_page(conversation_id, cursor)
+    get_ai_conversations_page(user_id, cursor)
+    recent_history(conversation_id)
+    # /api/user-votes
+    Vote.query.filter_by(user_id=user_id, group_post_id=None).all()
+    Vote.query.filter_by(user_id=user_id).filter(Vote.group_post_id.isnot(None)).all()
+
+def test_hot_queries_use_indexes(make_user, count_queries):
+    user_id = make_user()
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('EXPLAIN QUERY PLAN output is SQLite specific')
+        group = Group(name='Robotics', created_by=user_id, member_count=1)
+        conversation = AiConversation(user_id=user_id)
+        db.session.add_all([group, conversation])
+        db.session.flush()
+        db.session.execute(group_members.insert().values(user_id=user_id, group_id=group.id, is_admin=True))
+        # Something unread, so marking notifications read runs both its UPDATEs
+        db.session.add(Notification(user_id=user_id, sender_id=user_id, content='welcome', notification_type='mention'))
+        db.session.commit()
+
+        with count_queries(only=('SELECT', 'UPDATE')) as statements:
+            hot_queries(user_id, group.id, conversation.id)
+
+        assert len(statements) >= 10
+        scans = {' '.join(statement.split()): full_scans(statement, parameters)
+                 for statement, parameters in statements}
+        assert {statement: found for statement, found in scans.items() if found} == {}
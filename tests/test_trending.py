@@ -0,0 +1,59 @@
+import time
+import pytest
+import trending
+from app import app, db, Post, Tag
+from trending import TrendingTags, trending_tags
+
+def test_failed_tag_flush_does_not_fail_the_post(client, make_user, login, monkeypatch):
+    login(client, make_user())
+    monkeypatch.setattr(trending_tags, 'flush_size', 1)
+
+    def broken_insert(table):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(trending, 'dialect_insert', broken_insert)
+    response = client.post('/create_post', data={'content': 'studying for #finalsweek'})
+
+    # The request only buffers the use; the background thread writes it
+    assert response.status_code == 302
+    with app.app_context():
+        assert Post.query.filter_by(content='studying for #finalsweek').count() == 1
+    assert trending_tags._pending['finalsweek'] == 1
+    assert 'finalsweek' in [tag['name'] for tag in trending_tags.top(50)]
+
+    # A flush that fails keeps the uses for the next one that works
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            trending_tags.flush()
+        assert Tag.query.filter_by(name='finalsweek').first() is None
+    assert trending_tags._pending['finalsweek'] == 1
+
+    monkeypatch.undo()
+    with app.app_context():
+        trending_tags.flush()
+        assert Tag.query.filter_by(name='finalsweek').one().count == 1
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_background_thread_flushes_and_picks_up_other_workers_posts(make_user):
+    tags = TrendingTags(flush_size=1, flush_interval=0.05, rebuild_interval=0)
+    author_id = make_user()
+    with app.app_context():
+        # Served by some other worker: this process never recorded it
+        db.session.add(Post(content='robot build night #otherworker', user_id=author_id))
+        db.session.commit()
+
+    tags.start()
+    try:
+        tags.record({'thisworker'})
+        assert wait_for(lambda: 'otherworker' in [tag['name'] for tag in tags.top(50)])
+        with app.app_context():
+            assert wait_for(lambda: db.session.query(Tag.count).filter_by(name='thisworker').scalar() == 1)
+    finally:
+        tags.stop()
@@ -0,0 +1,97 @@
+import io
+import threading
+import time
+from PIL import Image
+from app import app, db, Upload, get_storage
+from images import variant_urls
+from uploads import MEDIA_URL, release_image, store_image
+
+def image_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def upload(data):
+    with app.app_context():
+        url = store_image(io.BytesIO(data))
+        db.session.commit()
+        return url
+
+def release(url):
+    with app.app_context():
+        release_image(url)
+        db.session.commit()
+
+def stored(url):
+    """(refcount or None if the row is gone, whether every variant file exists)"""
+    with app.app_context():
+        refcount = db.session.query(Upload.refcount).filter(Upload.url == url).scalar()
+        storage = get_storage()
+        files = all(storage.exists(variant[len(MEDIA_URL):]) for variant in variant_urls(url))
+        return refcount, files
+
+def test_unused_upload_is_collected(run_jobs):
+    url = upload(image_bytes('red'))
+    release(url)
+    run_jobs()
+
+    assert stored(url) == (None, False)
+
+def test_upload_reused_before_collection_is_kept(run_jobs):
+    data = image_bytes('green')
+    url = upload(data)
+    release(url)
+    assert upload(data) == url
+    run_jobs()
+
+    assert stored(url) == (1, True)
+
+def test_upload_reused_while_files_are_being_deleted_is_kept(run_jobs, monkeypatch):
+    data = image_bytes('blue')
+    url = upload(data)
+    release(url)
+
+    # The same image is posted again after the job has deleted one file
+    storage = get_storage()
+    delete = storage.delete
+    reupload = []
+    threads = []
+
+    def delete_and_reupload(name):
+        delete(name)
+        if not threads:
+            threads.append(threading.Thread(target=lambda: reupload.append(upload(data))))
+            threads[0].start()
+            time.sleep(0.2)  # let it get as far as it can
+
+    monkeypatch.setattr(storage, 'delete', delete_and_reupload)
+    run_jobs()
+    threads[0].join()
+
+    assert reupload == [url]
+    assert stored(url) == (1, True)
+
+def test_upload_reused_after_collection_died_halfway_is_rewritten(run_jobs, monkeypatch):
+    data = image_bytes('yellow')
+    url = upload(data)
+    release(url)
+
+    storage = get_storage()
+    delete = storage.delete
+    deleted = []
+
+    def delete_then_fail(name):
+        if deleted:
+            raise OSError('storage went away')
+        delete(name)
+        deleted.append(name)
+
+    monkeypatch.setattr(storage, 'delete', delete_then_fail)
+    run_jobs()  # fails, the retry is backed off
+    monkeypatch.undo()
+    assert stored(url) == (0, False)
+
+    assert upload(data) == url
+    assert stored(url) == (1, True)
+    with app.app_context():
+        assert db.session.query(Upload.collecting).filter(Upload.url == url).scalar() is False
@@ -0,0 +1,98 @@
+import random
+import threading
+from sqlalchemy import func
+from app import app, db, Post, Group, GroupPost, Vote, group_members
+
+VOTERS = 8
+VOTES_EACH = 25
+
+def make_targets(author_id, member_ids):
+    """A post and a group post, with every voter a member of the group."""
+    with app.app_context():
+        post = Post(content='vote on me', user_id=author_id)
+        group = Group(name='Debate Club', created_by=author_id, member_count=len(member_ids))
+        db.session.add_all([post, group])
+        db.session.flush()
+        group_post = GroupPost(content='vote on me too', user_id=author_id, group_id=group.id)
+        db.session.add(group_post)
+        db.session.execute(group_members.insert(), [
+            {'user_id': user_id, 'group_id': group.id, 'is_admin': False} for user_id in member_ids
+        ])
+        db.session.commit()
+        return post.id, group_post.id
+
+def run_voters(clients, votes):
+    """Run votes(client, index) on one thread per client, starting together.
+
+    Returns every response status.
+    """
+    barrier = threading.Barrier(len(clients))
+    statuses = []
+    lock = threading.Lock()
+
+    def voter(index, client):
+        barrier.wait()
+        results = votes(client, index)
+        with lock:
+            statuses.extend(results)
+
+    threads = [threading.Thread(target=voter, args=(i, client)) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def assert_counters_match_votes(model, column, target_id):
+    with app.app_context():
+        target = db.session.get(model, target_id)
+        counts = dict(db.session.query(Vote.vote_type, func.count(Vote.id))
+                      .filter(column == target_id)
+                      .group_by(Vote.vote_type).all())
+        assert target.upvotes == counts.get('upvote', 0)
+        assert target.downvotes == counts.get('downvote', 0)
+        return target.upvotes, target.downvotes
+
+def test_simultaneous_upvotes_are_all_counted(client, make_user, login):
+    author_id = make_user()
+    voter_ids = [make_user() for _ in range(VOTERS)]
+    post_id, group_post_id = make_targets(author_id, voter_ids)
+    clients = [login(app.test_client(), voter_id) for voter_id in voter_ids]
+
+    statuses = run_voters(clients, lambda client, index: [
+        client.post(f'/vote/{post_id}/upvote').status_code,
+        client.post(f'/group_vote/{group_post_id}/upvote').status_code,
+    ])
+
+    assert statuses == [200] * (2 * VOTERS)
+    assert assert_counters_match_votes(Post, Vote.post_id, post_id) == (VOTERS, 0)
+    assert assert_counters_match_votes(GroupPost, Vote.group_post_id, group_post_id) == (VOTERS, 0)
+
+def test_counters_stay_exact_under_parallel_toggling(client, make_user, login):
+    author_id = make_user()
+    voter_ids = [make_user() for _ in range(VOTERS)]
+    post_id, group_post_id = make_targets(author_id, voter_ids)
+    clients = [login(app.test_client(), voter_id) for voter_id in voter_ids]
+
+    def votes(client, index):
+        # Upvotes, downvotes, flips and retractions, in a different order per voter
+        rng = random.Random(index)
+        statuses = []
+        for _ in range(VOTES_EACH):
+            vote_type = rng.choice(('upvote', 'downvote'))
+            if rng.random() < 0.5:
+                url = f'/vote/{post_id}/{vote_type}'
+            else:
+                url = f'/group_vote/{group_post_id}/{vote_type}'
+            statuses.append(client.post(url).status_code)
+        return statuses
+
+    statuses = run_voters(clients, votes)
+
+    assert statuses == [200] * (VOTERS * VOTES_EACH)
+    assert_counters_match_votes(Post, Vote.post_id, post_id)
+    assert_counters_match_votes(GroupPost, Vote.group_post_id, group_post_id)
+    with app.app_context():
+        # At most one vote per user per post
+        assert db.session.query(Vote).filter(Vote.post_id == post_id).count() <= VOTERS
+        assert db.session.query(Vote).filter(Vote.group_post_id == group_post_id).count() <= VOTERS
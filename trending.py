@@ -0,0 +1,184 @@
+import atexit
+import heapq
+import math
+import re
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import func
+from app import app, db, Post, Tag, get_est_time, dialect_insert
+
+HASHTAG_RE = re.compile(r'#(\w+)')
+
+def extract_hashtags(content):
+    return set(HASHTAG_RE.findall(content or ''))
+
+class TrendingTags:
+    """Process-local hashtag trending with exponentially decayed scores.
+
+    Each use of a tag adds 1 to its score, and scores halve every half_life
+    seconds, so the ranking reflects roughly the last day of activity. All-time
+    counts still go to the Tag table, but batched: uses pile up in memory and
+    a background thread (start) writes them with one upsert every
+    flush_interval seconds, or sooner once flush_size have piled up.
+
+    A process only sees the posts it served, so with several workers the
+    same thread also rebuilds the scores from the Post table every
+    rebuild_interval seconds, and every worker converges on one ranking.
+    """
+
+    def __init__(self, half_life=6 * 3600, window=24 * 3600, flush_size=50,
+                 flush_interval=60, rebuild_interval=600, min_score=0.05, top_ttl=10):
+        self.decay = math.log(2) / half_life
+        self.window = window
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.rebuild_interval = rebuild_interval
+        self.min_score = min_score
+        self.top_ttl = top_ttl
+
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._scores = {}  # tag -> (score, as_of)
+        self._built_at = None
+        self._top_cache = None  # (expires_at, limit, result)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _decayed(self, score, as_of, now):
+        return score * math.exp(-self.decay * (now - as_of))
+
+    def _bump(self, tag, when, now):
+        score, as_of = self._scores.get(tag, (0.0, now))
+        weight = math.exp(-self.decay * (now - when))
+        self._scores[tag] = (self._decayed(score, as_of, now) + weight, now)
+
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._loop, name='trending-tags', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    self.flush()
+                    if self._built_at is None or time.monotonic() - self._built_at >= self.rebuild_interval:
+                        self.warm_up()
+            except Exception:
+                # A failed flush keeps its uses buffered for the next round
+                traceback.print_exc()
+
+    def record(self, tags):
+        """Count one use of each tag. Never touches the database.
+
+        Called after the post has committed; the background thread writes
+        the uses to the Tag table, and is woken early once a batch is due.
+        """
+        if not tags:
+            return
+
+        now = time.time()
+        with self._lock:
+            for tag in tags:
+                self._pending[tag] += 1
+                self._bump(tag, now, now)
+            self._top_cache = None
+            flush_due = sum(self._pending.values()) >= self.flush_size
+
+        if flush_due:
+            self._wake.set()
+
+    def flush(self):
+        """Write buffered uses to Tag.count with a single upsert."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+
+        if not pending:
+            return
+
+        table = Tag.__table__
+        try:
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={'count': func.coalesce(table.c.count, 0) + stmt.excluded.count}
+            )
+            db.session.execute(stmt, [{'name': tag, 'count': count} for tag, count in pending.items()])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._pending.update(pending)
+            raise
+
+    def top(self, limit=5):
+        """Return the highest scoring tags as [{'name': ..., 'score': ...}]."""
+        now = time.time()
+        with self._lock:
+            cached = self._top_cache
+            if cached and cached[0] > now and cached[1] >= limit:
+                return cached[2][:limit]
+
+            scored = []
+            for tag, (score, as_of) in list(self._scores.items()):
+                current = self._decayed(score, as_of, now)
+                if current < self.min_score:
+                    del self._scores[tag]
+                else:
+                    scored.append((current, tag))
+
+            result = [{'name': tag, 'score': round(score, 2)}
+                      for score, tag in heapq.nlargest(limit, scored)]
+            self._top_cache = (now + self.top_ttl, limit, result)
+            return result
+
+    def warm_up(self):
+        """Replace the scores with ones rebuilt from the last window of posts.
+
+        Run at startup and then every rebuild_interval seconds by the
+        background thread, so posts served by other workers count too.
+        """
+        now = time.time()
+        now_est = get_est_time().replace(tzinfo=None)
+        since = now_est - timedelta(seconds=self.window)
+
+        rows = db.session.query(Post.content, Post.created_at).filter(Post.created_at >= since).all()
+        scores = {}
+        for content, created_at in rows:
+            when = now - (now_est - created_at).total_seconds()
+            weight = math.exp(-self.decay * (now - when))
+            for tag in extract_hashtags(content):
+                scores[tag] = (scores.get(tag, (0.0, now))[0] + weight, now)
+
+        with self._lock:
+            self._scores = scores
+            self._built_at = time.monotonic()
+            self._top_cache = None
+
+trending_tags = TrendingTags(
+    flush_interval=app.config['TRENDING_FLUSH_INTERVAL'],
+    rebuild_interval=app.config['TRENDING_REBUILD_INTERVAL']
+)
+
+@app.before_request
+def start_trending_thread():
+    # Like the job workers, only processes that serve requests run it
+    if app.config['TRENDING_THREAD']:
+        trending_tags.start()
+
+@atexit.register
+def flush_trending_tags():
+    with app.app_context():
+        trending_tags.flush()
@@ -0,0 +1,117 @@
+import hashlib
+import re
+import tempfile
+from app import db, Upload, dialect_insert, get_storage
+from images import process_image, variant_urls
+from jobs import job, enqueue
+from storage import content_type
+
+CHUNK_SIZE = 64 * 1024
+MEDIA_URL = '/media/'
+MEDIA_RE = re.compile(r'^/media/(?P<digest>[0-9a-f]{64})-(?P<avatar>avatar-)?\d+\.jpg$')
+
+def spool_upload(stream):
+    """Copy an upload to a temporary file chunk by chunk, hashing as it goes.
+
+    Returns (sha256 hex digest, temporary file rewound to the start).
+    """
+    digest = hashlib.sha256()
+    spooled = tempfile.TemporaryFile()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        spooled.write(chunk)
+    spooled.seek(0)
+    return digest.hexdigest(), spooled
+
+def save_variants(digest, variants):
+    storage = get_storage()
+    for suffix, data in variants:
+        name = digest + suffix
+        storage.save(name, data, content_type(name))
+
+def store_image(stream, kind='post'):
+    """Store an uploaded image under its content hash and return its URL.
+
+    Identical uploads share one set of variants: if these bytes were stored
+    before, nothing is decoded or written and only the reference count goes
+    up, unless collect_upload was deleting them, in which case they are
+    written again. Variants go to the configured storage backend (get_storage). The
+    count is bumped in the caller's transaction, so it is committed together
+    with the post or avatar that uses the image.
+    Raises images.InvalidImage for anything that isn't an image we accept.
+    """
+    digest, spooled = spool_upload(stream)
+    with spooled:
+        # Take the reference before reusing the row: collect_upload only
+        # deletes rows whose refcount is still zero, so this one now stays
+        upload = db.session.query(Upload).filter(Upload.digest == digest, Upload.kind == kind)
+        pinned = upload.update({Upload.refcount: Upload.refcount + 1}, synchronize_session=False)
+        if pinned:
+            url, collecting = upload.with_entities(Upload.url, Upload.collecting).one()
+            if not collecting:
+                return url
+            # collect_upload may already have deleted some of the files
+            save_variants(digest, process_image(spooled, kind))
+            upload.update({Upload.collecting: False}, synchronize_session=False)
+            return url
+
+        variants = process_image(spooled, kind)
+        save_variants(digest, variants)
+        url = MEDIA_URL + digest + variants[-1][0]
+        size = sum(len(data) for _, data in variants)
+
+    table = Upload.__table__
+    stmt = dialect_insert(table).values(digest=digest, kind=kind, url=url, size=size, refcount=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['digest', 'kind'],
+        set_={'refcount': table.c.refcount + 1}
+    )
+    db.session.execute(stmt)
+    return url
+
+def release_image(url):
+    """Drop one reference to a stored image, in the caller's transaction.
+
+    Files are removed by the collect_upload job once nothing uses them.
+    URLs that aren't content-addressed uploads (defaults, older uploads) are ignored.
+    """
+    match = MEDIA_RE.match(url or '')
+    if not match:
+        return
+
+    digest = match.group('digest')
+    kind = 'avatar' if match.group('avatar') else 'post'
+    db.session.query(Upload).filter(
+        Upload.digest == digest, Upload.kind == kind, Upload.refcount > 0
+    ).update({Upload.refcount: Upload.refcount - 1}, synchronize_session=False)
+    enqueue('collect_upload', digest=digest, kind=kind)
+
+@job('collect_upload')
+def collect_upload(digest, kind):
+    """Delete an image nothing references any more, files first, then its row.
+
+    The row is marked collecting and committed before any file goes, so if
+    the job dies halfway, a store_image that revives the row knows to write
+    the variants again. The files are then deleted under the row's lock
+    (taken by re-marking it), so a concurrent store_image waits for the
+    whole collection and finds no row, rather than reusing files that are
+    being deleted.
+    """
+    unused = db.session.query(Upload).filter(
+        Upload.digest == digest, Upload.kind == kind, Upload.refcount <= 0
+    )
+    # The same bytes may have been uploaded again since the job was queued
+    if not unused.update({Upload.collecting: True}, synchronize_session=False):
+        return
+    url = unused.with_entities(Upload.url).scalar()
+    db.session.commit()
+
+    if not unused.update({Upload.collecting: True}, synchronize_session=False):
+        return
+    storage = get_storage()
+    for variant in variant_urls(url):
+        storage.delete(variant[len(MEDIA_URL):])
+    unused.delete(synchronize_session=False)
@@ -0,0 +1,84 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+class UsernameIndex:
+    """Process-local sorted username index for @mention autocomplete.
+
+    Usernames are kept lowercased in a sorted list, so a prefix lookup is a
+    bisect to the first candidate plus a walk over at most limit entries:
+    no database round trip per keystroke. The process that handles a
+    registration or username/avatar change updates the index in place;
+    changes made by other worker processes are picked up by reloading
+    everything from loader every rebuild_interval seconds, on a background
+    thread while the old index keeps serving.
+
+    loader returns (user id, username, avatar_url) rows.
+    """
+
+    def __init__(self, loader, rebuild_interval=600):
+        self.loader = loader
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._keys = []  # sorted (lowercased username, user id)
+        self._users = {}  # user id -> (username, avatar_url)
+        self._built_at = None
+        self._rebuilding = False
+
+    def build(self):
+        """Reload every user from loader, replacing the current index."""
+        rows = [row for row in self.loader() if row[1]]
+        keys = sorted((username.lower(), user_id) for user_id, username, _ in rows)
+        users = {user_id: (username, avatar_url) for user_id, username, avatar_url in rows}
+        with self._lock:
+            self._keys = keys
+            self._users = users
+            self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        def rebuild():
+            try:
+                self.build()
+            finally:
+                self._rebuilding = False
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=rebuild, name='username-index', daemon=True).start()
+
+    def update(self, user_id, username, avatar_url):
+        """Add a user or apply a username/avatar change."""
+        with self._lock:
+            previous = self._users.get(user_id)
+            if previous and previous[0] != username:
+                key = (previous[0].lower(), user_id)
+                position = bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+            if not previous or previous[0] != username:
+                insort(self._keys, (username.lower(), user_id))
+            self._users[user_id] = (username, avatar_url)
+
+    def complete(self, prefix, limit=10):
+        """Return up to limit users whose username starts with prefix, as
+        [{'id': ..., 'username': ..., 'avatar_url': ...}] in alphabetical order.
+        """
+        if self._built_at is None:
+            self.build()
+        elif time.monotonic() - self._built_at > self.rebuild_interval:
+            self._rebuild_in_background()
+
+        prefix = prefix.lower()
+        results = []
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, user_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                username, avatar_url = self._users[user_id]
+                results.append({'id': user_id, 'username': username, 'avatar_url': avatar_url})
+                position += 1
+        return results
@@ -0,0 +1,99 @@
+from sqlalchemy import func, select
+from app import db, Post, GroupPost, Vote, dialect_insert
+from jobs import enqueue
+
+VOTE_TYPES = ('upvote', 'downvote')
+
+def _apply_vote(user_id, vote_type, target_column, target_id):
+    """Apply one vote toggle and return the counter deltas as (upvotes, downvotes).
+
+    Every step is a single conditional statement whose rowcount tells us what
+    happened, so two requests racing on the same (user, post) never both see
+    "no vote yet". Returns None if the row changed underneath us between steps.
+    """
+    opposite = 'downvote' if vote_type == 'upvote' else 'upvote'
+    key = (Vote.user_id == user_id) & (target_column == target_id)
+
+    # No vote yet: insert it, the unique index turns a racing duplicate into a no-op
+    stmt = dialect_insert(Vote.__table__).values(
+        user_id=user_id,
+        vote_type=vote_type,
+        **{target_column.key: target_id}
+    ).on_conflict_do_nothing(index_elements=['user_id', target_column.key])
+    if db.session.execute(stmt).rowcount == 1:
+        return (1, 0) if vote_type == 'upvote' else (0, 1)
+
+    # Same vote again: toggle it off
+    deleted = db.session.execute(
+        Vote.__table__.delete().where(key & (Vote.vote_type == vote_type))
+    ).rowcount
+    if deleted == 1:
+        return (-1, 0) if vote_type == 'upvote' else (0, -1)
+
+    # Opposite vote: flip it
+    flipped = db.session.execute(
+        Vote.__table__.update().where(key & (Vote.vote_type == opposite)).values(vote_type=vote_type)
+    ).rowcount
+    if flipped == 1:
+        return (1, -1) if vote_type == 'upvote' else (-1, 1)
+
+    return None
+
+def cast_vote(user_id, vote_type, post_id=None, group_post_id=None, attempts=3):
+    """Toggle a user's vote on a post or group post.
+
+    Returns (upvotes, downvotes, upvoted), where upvoted is True when this
+    call added an upvote (a fresh one or a flip from downvote). Whenever an
+    upvote is added or taken back, an upvote_notification job is queued in
+    the same transaction to bring the author's notification up to date.
+
+    Counters move with UPDATE ... SET upvotes = upvotes + :d, never a
+    read-modify-write in Python, so concurrent voters can't lose updates.
+    The caller's session is committed.
+    """
+    if vote_type not in VOTE_TYPES:
+        raise ValueError(f"Invalid vote type: {vote_type}")
+
+    if post_id is not None:
+        model, target_column, target_id = Post, Vote.post_id, post_id
+    else:
+        model, target_column, target_id = GroupPost, Vote.group_post_id, group_post_id
+
+    for _ in range(attempts):
+        deltas = _apply_vote(user_id, vote_type, target_column, target_id)
+        if deltas is not None:
+            break
+    else:
+        db.session.rollback()
+        raise RuntimeError("Vote kept changing concurrently, giving up")
+
+    upvote_delta, downvote_delta = deltas
+    db.session.query(model).filter(model.id == target_id).update({
+        model.upvotes: func.coalesce(model.upvotes, 0) + upvote_delta,
+        model.downvotes: func.coalesce(model.downvotes, 0) + downvote_delta
+    }, synchronize_session=False)
+
+    upvotes, downvotes = db.session.query(model.upvotes, model.downvotes) \
+        .filter(model.id == target_id).one()
+    if upvote_delta:
+        # The author's notification is updated by the job worker after this commit
+        enqueue('upvote_notification', voter_id=user_id, **{target_column.key: target_id})
+    db.session.commit()
+
+    return upvotes, downvotes, upvote_delta == 1
+
+def dedupe_votes():
+    """Drop duplicate votes left over from before the unique indexes existed."""
+    keep = select(func.min(Vote.id)).group_by(Vote.user_id, Vote.post_id, Vote.group_post_id)
+    db.session.query(Vote).filter(Vote.id.notin_(keep)).delete(synchronize_session=False)
+    db.session.commit()
+
+def recount_votes():
+    """Rebuild every upvote/downvote counter from the vote table."""
+    for model, column in ((Post, Vote.post_id), (GroupPost, Vote.group_post_id)):
+        for counter, vote_type in ((model.upvotes, 'upvote'), (model.downvotes, 'downvote')):
+            count = db.session.query(func.count(Vote.id)) \
+                .filter(column == model.id, Vote.vote_type == vote_type) \
+                .scalar_subquery()
+            db.session.query(model).update({counter: count}, synchronize_session=False)
+    db.session.commit()